@@ -0,0 +1,53 @@
+import sys
+import json
+import argparse
+from benchmarks.generators import mixes
+from benchmarks.suite import run_suite, compare
+
+def int_list(text : str) -> list[int]:
+    return [int(value) for value in text.split(",")]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the bytecode compiler on synthetic programs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--sizes", type=int_list, default=[10, 100, 1000, 10000], help="comma-separated program sizes in instructions (default: 10,100,1000,10000)")
+    run.add_argument("--depths", type=int_list, default=[16], help="comma-separated maximum stack depths (default: 16)")
+    run.add_argument("--mixes", type=lambda text: text.split(","), default=["balanced"], help=f"comma-separated opcode mixes among {', '.join(mixes)} (default: balanced)")
+    run.add_argument("--opt", type=int, choices=range(4), default=0, help="LLVM optimisation level (default: 0)")
+    run.add_argument("--runs", type=int, default=20, help="single calls per program (default: 20)")
+    run.add_argument("--records", type=int, default=1000, help="records per batch call (default: 1000)")
+    run.add_argument("--seed", type=int, default=0, help="seed of the generators (default: 0)")
+    run.add_argument("--output", help="write the results as JSON to this file")
+
+    diff = commands.add_parser("compare", help="flag regressions between two result files")
+    diff.add_argument("old", help="baseline results")
+    diff.add_argument("new", help="new results")
+    diff.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression (default: 0.1)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "run":
+        results = run_suite(args.sizes, args.depths, args.mixes, args.opt, args.runs, args.records, args.seed, log=sys.stderr)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        return 0
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.threshold)
+    for regression in regressions:
+        print(f"{regression['case']}: {regression['metric']} {regression['old']:.3g} -> {regression['new']:.3g} "
+              f"({regression['slowdown']:.2f}x slower)")
+    print(f"{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
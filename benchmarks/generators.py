@@ -0,0 +1,43 @@
+import random
+from bytecode_compiler.parser import max_array_size, word_size, capacity
+
+# Relative weights of the opcodes in the generated programs
+mixes = {
+    "balanced": {"LOAD": 4, "STORE": 2, "POP": 2, "ADD": 2, "SUB": 2, "DUP": 1},
+    "arithmetic": {"LOAD": 4, "STORE": 1, "POP": 1, "ADD": 4, "SUB": 4, "DUP": 2},
+    "memory": {"LOAD": 6, "STORE": 6, "POP": 4, "ADD": 1, "SUB": 1, "DUP": 1},
+}
+
+def generate_assembly(length : int, max_depth : int = 16, mix : str = "balanced", seed : int = 0) -> str:
+    """Generate the assembly of a program of 'length' instructions followed by
+    STOP, drawing opcodes with the weights of 'mix' among those that keep the
+    stack depth between 0 and 'max_depth', so the program never fails."""
+    if not 1 <= max_depth <= capacity:
+        raise ValueError(f"Maximum stack depth must be between 1 and {capacity}, got {max_depth}")
+    if mix not in mixes:
+        raise ValueError(f"Unknown opcode mix '{mix}', expected one of {sorted(mixes)}")
+    rng = random.Random(seed)
+    weights = mixes[mix]
+    lines = []
+    depth = 0
+    for _ in range(length):
+        allowed = []
+        if depth < max_depth:
+            allowed += ["LOAD", "DUP"] if depth >= 1 else ["LOAD"]
+        if depth >= 1:
+            allowed += ["STORE", "POP"]
+        if depth >= 2:
+            allowed += ["ADD", "SUB"]
+        cmd = rng.choices(allowed, [weights[cmd] for cmd in allowed])[0]
+        if cmd in ("LOAD", "STORE"):
+            lines.append(f"{cmd} {rng.randrange(max_array_size)}")
+        else:
+            lines.append(cmd)
+        depth += {"LOAD": 1, "STORE": 0, "POP": -1, "ADD": -1, "SUB": -1, "DUP": 1}[cmd]
+    lines.append("STOP")
+    return "\n".join(lines)
+
+def generate_records(n : int, seed : int = 0) -> list[list[int]]:
+    """Generate n records of random words."""
+    rng = random.Random(seed)
+    return [[rng.getrandbits(word_size) for _ in range(max_array_size)] for _ in range(n)]
@@ -0,0 +1,114 @@
+import sys
+import platform
+import llvmlite
+from time import perf_counter
+import bytecode_compiler
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.compiler import compile_bytecode, create_target_machine
+from bytecode_compiler.execution import create_engine, get_function, get_batch_function, call_function, call_batch_function_buffer, int_list_to_bytearray
+from bytecode_compiler.profiling import Profiler
+from benchmarks.generators import generate_assembly, generate_records
+
+# Metrics where a higher value is better; all other metrics are times
+throughput_metrics = ("records_per_second", "instructions_per_second")
+
+def run_case(instructions : int, max_depth : int = 16, mix : str = "balanced", opt_level : int = 0,
+             runs : int = 20, records : int = 1000, seed : int = 0) -> dict:
+    """Benchmark one synthetic program through every stage of the pipeline.
+    Returns the mean time of each phase in seconds, and the throughput of
+    the batch entry point over 'records' records."""
+    assembly = generate_assembly(instructions, max_depth, mix, seed)
+    in_records = generate_records(records, seed)
+    out_records = generate_records(records, seed + 1)
+    profiler = Profiler()
+
+    with profiler.phase("parse_assembly"):
+        bytecode = parse_assembly(assembly)
+    target_machine = create_target_machine(opt_level)
+    module = compile_bytecode(bytecode, batch=True, opt_level=opt_level, target_machine=target_machine, profiler=profiler)
+    engine = create_engine(module, target_machine, profiler)
+
+    # Single calls through the list API: marshalling vs native code
+    cfunc = get_function(engine)
+    for i in range(runs):
+        call_function(cfunc, in_records[i % records], out_records[i % records], profiler=profiler)
+
+    # Batch throughput, without marshalling
+    in_buffer = bytearray().join(int_list_to_bytearray(record) for record in in_records)
+    out_buffer = bytearray().join(int_list_to_bytearray(record) for record in out_records)
+    batch_cfunc = get_batch_function(engine)
+    start = perf_counter()
+    call_batch_function_buffer(batch_cfunc, in_buffer, out_buffer, records)
+    batch_time = perf_counter() - start
+    engine.close()
+
+    return {
+        "instructions": instructions,
+        "max_depth": max_depth,
+        "mix": mix,
+        "opt_level": opt_level,
+        "phases": {name: phase["seconds"] / phase["calls"] for name, phase in profiler.phases.items()},
+        "batch_call": batch_time,
+        "records_per_second": records / batch_time,
+        "instructions_per_second": records * len(bytecode) / batch_time,
+    }
+
+def run_suite(sizes : list[int] = (10, 100, 1000, 10000), depths : list[int] = (16,), mixes : list[str] = ("balanced",),
+              opt_level : int = 0, runs : int = 20, records : int = 1000, seed : int = 0, log = None) -> dict:
+    """Benchmark every combination of program size, stack depth and opcode mix.
+    Progress is written to 'log' (a text file) if given."""
+    results = []
+    for size in sizes:
+        for depth in depths:
+            for mix in mixes:
+                result = run_case(size, depth, mix, opt_level, runs, records, seed)
+                if log is not None:
+                    print(f"{case_name(result)}: {result['records_per_second']:.0f} records/s, "
+                          f"{result['instructions_per_second']:.3g} instructions/s", file=log)
+                results.append(result)
+    return {
+        "meta": {
+            "version": bytecode_compiler.__version__,
+            "python": platform.python_version(),
+            "llvmlite": llvmlite.__version__,
+            "machine": platform.machine(),
+            "platform": sys.platform,
+        },
+        "results": results,
+    }
+
+def case_name(result : dict) -> str:
+    return f"{result['instructions']} instructions, depth {result['max_depth']}, {result['mix']}, -O{result['opt_level']}"
+
+def metrics(result : dict) -> dict:
+    """Flatten the metrics of a case."""
+    values = {f"phases.{name}": seconds for name, seconds in result["phases"].items()}
+    values["batch_call"] = result["batch_call"]
+    for metric in throughput_metrics:
+        values[metric] = result[metric]
+    return values
+
+def compare(old : dict, new : dict, threshold : float = 0.1, min_seconds : float = 1e-4) -> list[dict]:
+    """Return the regressions of 'new' over 'old' (two run_suite results):
+    metrics of the same case that are more than 'threshold' (relative) slower.
+    Times under 'min_seconds' in both runs are ignored as noise."""
+    old_cases = {case_name(result): result for result in old["results"]}
+    regressions = []
+    for result in new["results"]:
+        name = case_name(result)
+        if name not in old_cases:
+            continue
+        old_metrics = metrics(old_cases[name])
+        for metric, value in metrics(result).items():
+            old_value = old_metrics.get(metric)
+            if not old_value or not value:
+                continue
+            if metric in throughput_metrics:
+                slowdown = old_value / value
+            else:
+                if max(old_value, value) < min_seconds:
+                    continue
+                slowdown = value / old_value
+            if slowdown > 1 + threshold:
+                regressions.append({"case": name, "metric": metric, "old": old_value, "new": value, "slowdown": slowdown})
+    return regressions
@@ -0,0 +1,120 @@
+import os
+import ctypes
+import hashlib
+import tempfile
+import subprocess
+from llvmlite import ir
+import llvmlite.binding as binding
+from bytecode_compiler import __version__
+from bytecode_compiler.compiler import compile_bytecode, create_target_machine, to_llvm_module
+from bytecode_compiler.engine import CompiledProgram, bytecode_hash
+from bytecode_compiler.execution import batch_func_type
+from bytecode_compiler.parser import byteorders
+
+def emit_object(module : ir.Module | binding.ModuleRef, path : str, target_machine : binding.TargetMachine) -> None:
+    """Compile the module to a native object file."""
+    with open(path, "wb") as f:
+        f.write(target_machine.emit_object(to_llvm_module(module)))
+
+def link_shared(object_path : str, library_path : str, linker : str = "cc") -> None:
+    """Link an object file into a shared library with the system linker."""
+    try:
+        subprocess.run([linker, "-shared", "-o", library_path, object_path], check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError(f"Linker '{linker}' not found")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Linking '{library_path}' failed: {e.stderr.strip()}")
+
+class ArtifactCache:
+    """An on-disk cache of ahead-of-time compiled programs.
+
+    Each program is compiled into a shared library exporting 'program_<hash>'
+    (and 'program_<hash>_batch'), stored under 'directory/<compiler version>/'
+    and keyed by the bytecode hash and the compile options. Loading a cached
+    artifact only opens the library, without running LLVM."""
+
+    def __init__(self, directory : str, byteorder : str = "big", promote_stack : bool = False,
+                 opt_level : int = 2, cpu : str = "", features : str = "", linker : str = "cc"):
+        if byteorder not in byteorders:
+            raise ValueError(f"Unknown byte order '{byteorder}', expected one of {byteorders}")
+        self.directory = os.path.join(directory, __version__)
+        self.byteorder = byteorder
+        self.promote_stack = promote_stack
+        self.opt_level = opt_level
+        self.cpu = cpu
+        self.features = features
+        self.linker = linker
+        self.target_machine = None
+        self.programs = {}
+        self.builds = 0
+        self.loads = 0
+
+    def options(self) -> str:
+        """Return the compile options as a file name suffix."""
+        suffix = f"{self.byteorder}-O{self.opt_level}"
+        if self.promote_stack:
+            suffix += "-ssa"
+        if self.cpu:
+            suffix += f"-{self.cpu}"
+        if self.features:
+            suffix += "-" + hashlib.sha256(self.features.encode()).hexdigest()[:8]
+        return suffix
+
+    def path(self, bytecode : list[list[int]]) -> str:
+        """Return the path of the artifact of the bytecode."""
+        return os.path.join(self.directory, f"{bytecode_hash(bytecode)}-{self.options()}.so")
+
+    def build(self, bytecode : list[list[int]]) -> str:
+        """Compile the bytecode into a shared library in the cache and return its path."""
+        key = bytecode_hash(bytecode)
+        path = self.path(bytecode)
+        if self.target_machine is None:
+            self.target_machine = create_target_machine(self.opt_level, self.cpu, self.features, reloc="pic")
+        module = compile_bytecode(bytecode, name=f"program_{key[:16]}", batch=True, byteorder=self.byteorder,
+                                  promote_stack=self.promote_stack, opt_level=self.opt_level, target_machine=self.target_machine)
+
+        # Build in a temporary directory, then atomically move the library into place
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            object_path = os.path.join(tmp, "program.o")
+            library_path = os.path.join(tmp, "program.so")
+            emit_object(module, object_path, self.target_machine)
+            link_shared(object_path, library_path, self.linker)
+            os.replace(library_path, path)
+        self.builds += 1
+        return path
+
+    def load(self, bytecode : list[list[int]]) -> CompiledProgram:
+        """Return the program for the bytecode, loading its artifact (and
+        building it first if it is not in the cache)."""
+        key = bytecode_hash(bytecode)
+        program = self.programs.get(key)
+        if program is not None:
+            return program
+
+        path = self.path(bytecode)
+        if not os.path.exists(path):
+            self.build(bytecode)
+        library = ctypes.CDLL(path)
+        name = f"program_{key[:16]}"
+        def address(symbol : str) -> int:
+            return ctypes.cast(getattr(library, symbol), ctypes.c_void_p).value
+
+        program = CompiledProgram(key, name, None, address(name), self.byteorder)
+        program.batch_cfunc = batch_func_type(address(f"{name}_batch"))
+        program.library = library  # Keep the library loaded
+        self.programs[key] = program
+        self.loads += 1
+        return program
+
+    def __contains__(self, bytecode : list[list[int]]) -> bool:
+        """Return whether the program is loaded or has an artifact in the cache."""
+        return bytecode_hash(bytecode) in self.programs or os.path.exists(self.path(bytecode))
+
+    def compile(self, bytecode : list[list[int]]) -> CompiledProgram:
+        """Same as load, so that an ArtifactCache can stand in for an Engine."""
+        return self.load(bytecode)
+
+    def run(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int]) -> tuple[int, list[int], list[int]]:
+        """Load (building if needed) and run the bytecode."""
+        return self.load(bytecode).run(in_array, out_array)
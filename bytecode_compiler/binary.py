@@ -0,0 +1,141 @@
+import mmap
+import struct
+from typing import Iterable, Iterator
+from bytecode_compiler.parser import cmd2opcode
+
+# Binary format: 2 bytes per instruction, the opcode then its operand (0 if none)
+instruction_size = 2
+has_operand = {opcode: has_arg for opcode, has_arg in cmd2opcode.values()}
+
+# Bundle format: a header, an index of (offset, length) entries, then the programs
+bundle_magic = b"BCB1"
+bundle_header = struct.Struct("<4sI")  # magic, number of programs
+bundle_entry = struct.Struct("<QI")  # offset from the start of the file, length in bytes
+
+def encode(bytecode : list[list[int]]) -> bytes:
+    """Encode bytecode in the binary format."""
+    data = bytearray(instruction_size * len(bytecode))
+    for i, (opcode, *args) in enumerate(bytecode):
+        data[2 * i] = opcode
+        if args:
+            data[2 * i + 1] = args[0]
+    return bytes(data)
+
+def decode_instruction(opcode : int, operand : int, position : int) -> list[int]:
+    """Decode one instruction, validating its opcode and operand."""
+    if opcode not in has_operand:
+        raise ValueError(f"Unknown opcode {opcode} at byte {position}")
+    if has_operand[opcode]:
+        return [opcode, operand]
+    if operand != 0:
+        raise ValueError(f"Opcode {opcode} at byte {position} does not take an operand")
+    return [opcode]
+
+def check_stops(instructions : Iterable[list[int]]) -> Iterator[list[int]]:
+    """Pass instructions through, then raise a ValueError unless exactly one
+    of them was a STOP, like parse_assembly."""
+    stops = 0
+    for instruction in instructions:
+        if instruction[0] == 0x00:
+            stops += 1
+        yield instruction
+    if stops != 1:
+        raise ValueError("There must be exactly one STOP command")
+
+def iter_decode(data) -> Iterator[list[int]]:
+    """Decode instructions one at a time from bytes, a memoryview or any
+    buffer-protocol object, without copying it."""
+    view = memoryview(data).cast('B')
+    if len(view) % instruction_size:
+        raise ValueError(f"Truncated bytecode: {len(view)} bytes is not a multiple of {instruction_size}")
+    yield from check_stops(decode_instruction(view[i], view[i + 1], i) for i in range(0, len(view), instruction_size))
+
+def decode(data) -> list[list[int]]:
+    """Decode bytecode from the binary format."""
+    return list(iter_decode(data))
+
+def decode_stream(chunks : Iterable[bytes]) -> Iterator[list[int]]:
+    """Decode instructions from a stream of chunks of arbitrary sizes, such
+    as iter(lambda: f.read(65536), b"")."""
+    yield from check_stops(decode_chunks(chunks))
+
+def decode_chunks(chunks : Iterable[bytes]) -> Iterator[list[int]]:
+    position = 0
+    pending = None
+    for chunk in chunks:
+        view = memoryview(chunk).cast('B')
+        start = 0
+        if pending is not None and len(view):
+            yield decode_instruction(pending, view[0], position)
+            position += instruction_size
+            pending = None
+            start = 1
+        end = start + (len(view) - start) // instruction_size * instruction_size
+        for i in range(start, end, instruction_size):
+            yield decode_instruction(view[i], view[i + 1], position)
+            position += instruction_size
+        if end < len(view):
+            pending = view[end]
+    if pending is not None:
+        raise ValueError(f"Truncated bytecode: stream ends in the middle of the instruction at byte {position}")
+
+def write_bundle(filename : str, programs : Iterable[list[list[int]]]) -> int:
+    """Write programs into a bundle file and return the number of programs."""
+    encoded = [encode(bytecode) for bytecode in programs]
+    offset = bundle_header.size + bundle_entry.size * len(encoded)
+    with open(filename, "wb") as f:
+        f.write(bundle_header.pack(bundle_magic, len(encoded)))
+        for data in encoded:
+            f.write(bundle_entry.pack(offset, len(data)))
+            offset += len(data)
+        for data in encoded:
+            f.write(data)
+    return len(encoded)
+
+class Bundle:
+    """A memory-mapped bundle file, whose programs are decoded on access."""
+
+    def __init__(self, filename : str):
+        with open(filename, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if len(self.view) < bundle_header.size:
+            self.close()
+            raise ValueError(f"'{filename}' is not a bytecode bundle")
+        magic, self.count = bundle_header.unpack_from(self.view)
+        if magic != bundle_magic or len(self.view) < bundle_header.size + bundle_entry.size * self.count:
+            self.close()
+            raise ValueError(f"'{filename}' is not a bytecode bundle")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def raw(self, index : int) -> memoryview:
+        """Return the encoded program at 'index', without copying it. The view
+        must be released before the bundle is closed."""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"Program index {index} out of range")
+        offset, length = bundle_entry.unpack_from(self.view, bundle_header.size + bundle_entry.size * index)
+        if offset + length > len(self.view):
+            raise ValueError(f"Program {index} lies outside of the bundle")
+        return self.view[offset:offset + length]
+
+    def __getitem__(self, index : int) -> list[list[int]]:
+        return decode(self.raw(index))
+
+    def __iter__(self) -> Iterator[list[list[int]]]:
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self) -> None:
+        """Unmap the bundle file."""
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
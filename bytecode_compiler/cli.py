@@ -1,10 +1,18 @@
+import os
 import sys
-from bytecode_compiler.parser import parse_assembly, max_array_size, word_size
-from bytecode_compiler.compiler import compile_bytecode
-from bytecode_compiler.execution import execute
+import argparse
+from collections import Counter
+from itertools import islice
+from bytecode_compiler.parser import parse_assembly, max_array_size, word_size, word_sizes, capacity, get_record_size, byteorders
+from bytecode_compiler.records import parse_word, iter_text_records, write_text_record, BinaryRecordReader, words_into, words_from
+from bytecode_compiler.peephole import optimize_bytecode, check_stack
+from bytecode_compiler.profiling import Profiler, timed
 
-def read_array_from_file(filename : str) -> list:
-    """Read an array of integers from a file, up to max_stack_size elements."""
+# LLVM is only imported by the paths that compile, so that parsing,
+# checking and running on a daemon start fast.
+
+def read_array_from_file(filename : str, word_size : int = word_size) -> list:
+    """Read an array of integers of 'word_size' bits from a file, up to max_stack_size elements."""
     array = []
     try:
         with open(filename, 'r') as f:
@@ -12,13 +20,7 @@ def read_array_from_file(filename : str) -> list:
                 line = line.strip()
                 if not line or line.startswith('#'):
                     continue  # Skip comments and empty lines
-                try:
-                    value = int(line)
-                except ValueError:
-                    raise ValueError(f"Invalid integer '{line}' on line {line_num} in '{filename}'")
-                if value < 0 or value >= 2**word_size:
-                    raise ValueError(f"Integer {value} on line {line_num} in '{filename}' must be between 0 and 2^{word_size - 1}")
-                array.append(value)
+                array.append(parse_word(line, line_num, filename, word_size))
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
         sys.exit(1)
@@ -29,55 +31,245 @@ def read_array_from_file(filename : str) -> list:
     array.extend([0] * (max_array_size - len(array)))
     return array
 
+def parse_args(argv : list[str] = None) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(prog="bytecode-compiler", description="Compile and run a stack bytecode program.")
+    parser.add_argument("assembly_file", help="the assembly program")
+    parser.add_argument("in_array_file", help="the 'in' array, one integer per line")
+    parser.add_argument("out_array_file", help="the initial 'out' array, one integer per line")
+    parser.add_argument("--opt", type=int, choices=range(4), default=0, metavar="{0,1,2,3}",
+                        help="LLVM optimisation level (default: 0)")
+    parser.add_argument("--mcpu", default="", help="target CPU, or 'native' for the host CPU")
+    parser.add_argument("--mattr", default="", help="target CPU features, e.g. '+avx2'")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each phase of the pipeline, count the instructions run by opcode and the runs by result code, and print the stats as JSON")
+    parser.add_argument("--peephole", action="store_true", help="remove dead and redundant instructions from the bytecode before compiling it")
+    parser.add_argument("--word-size", type=int, choices=word_sizes, default=word_size,
+                        help=f"size in bits of the words, which wrap around on overflow (default: {word_size})")
+    parser.add_argument("--capacity", type=int, default=capacity, help=f"maximum number of words on the stack (default: {capacity})")
+    parser.add_argument("--byteorder", choices=byteorders, default="big", help="byte order of the words in binary files (default: big)")
+    parser.add_argument("--stream", metavar="OUTPUT",
+                        help="run the program over every record of the 'in' file and write the resulting 'out' records to OUTPUT")
+    parser.add_argument("--format", choices=("text", "binary"), default="text",
+                        help=f"record format of the files in stream mode: text records separated by '---' lines, "
+                             f"or binary records of {max_array_size} raw words of --word-size bits (default: text)")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="records per native call in stream mode (default: 1024)")
+    parser.add_argument("--status", metavar="FILE", help="in stream mode, write the result code of each record to FILE, one byte per record")
+    parser.add_argument("--check", action="store_true",
+                        help="only parse the program and the arrays, and report stack errors the program may hit, without loading LLVM")
+    parser.add_argument("--no-ir", action="store_true", help="do not print the generated LLVM IR")
+    parser.add_argument("--no-bytecode", action="store_true", help="do not print the bytecode")
+    parser.add_argument("--connect", metavar="SOCKET",
+                        help="run the program on a daemon listening on the Unix socket SOCKET (see bytecode-compiler-daemon) instead of compiling it")
+    return parser.parse_args(argv)
+
+def broadcast(records):
+    """Yield the records, or repeat the only record forever if there is just one."""
+    first = next(records, None)
+    if first is None:
+        return
+    second = next(records, None)
+    if second is None:
+        while True:
+            yield first
+    yield first
+    yield second
+    yield from records
+
+def run_stream(bytecode : list[list[int]], args : argparse.Namespace, profiler : Profiler = None) -> Counter:
+    """Run the program over the record files of the command line, one chunk
+    of records at a time, and return the count of each result code.
+    'profiler' times the phases and collects the instruction counters."""
+    from bytecode_compiler.engine import Engine
+    if args.chunk_size < 1:
+        raise ValueError(f"Chunk size must be positive, got {args.chunk_size}")
+    with timed(profiler, "compile"):
+        engine = Engine(byteorder=args.byteorder, opt_level=args.opt, cpu=args.mcpu, features=args.mattr, instrument=profiler is not None,
+                        word_size=args.word_size, capacity=args.capacity)
+        program = engine.compile(bytecode)
+    record_size = get_record_size(args.word_size)
+    results = Counter()
+    status_file = open(args.status, "wb") if args.status else None
+    try:
+        if args.format == "text":
+            in_buffer = bytearray(args.chunk_size * record_size)
+            out_buffer = bytearray(args.chunk_size * record_size)
+            with open(args.in_array_file) as fin, open(args.out_array_file) as fout, open(args.stream, "w") as output:
+                in_records = iter_text_records(fin, args.in_array_file, args.word_size)
+                out_records = broadcast(iter_text_records(fout, args.out_array_file, args.word_size))
+                while True:
+                    with timed(profiler, "read_records"):
+                        chunk = list(islice(in_records, args.chunk_size))
+                        for i, in_array in enumerate(chunk):
+                            out_array = next(out_records, None)
+                            if out_array is None:
+                                raise ValueError(f"'{args.out_array_file}' has fewer records than '{args.in_array_file}'")
+                            words_into(in_buffer, i * record_size, in_array, args.byteorder, args.word_size)
+                            words_into(out_buffer, i * record_size, out_array, args.byteorder, args.word_size)
+                    if not chunk:
+                        break
+                    with timed(profiler, "native_call"):
+                        status = program.run_batch_buffer(in_buffer, out_buffer, len(chunk))
+                    with timed(profiler, "write_records"):
+                        for i, result in enumerate(status):
+                            write_text_record(output, words_from(out_buffer, i * record_size, byteorder=args.byteorder, word_size=args.word_size), result)
+                    results.update(status)
+                    if status_file:
+                        status_file.write(status)
+        else:
+            with open(args.in_array_file, "rb") as fin, open(args.out_array_file, "rb") as fout, open(args.stream, "wb") as output:
+                in_reader = BinaryRecordReader(fin, args.chunk_size, args.in_array_file, args.word_size)
+                out_reader = BinaryRecordReader(fout, args.chunk_size, args.out_array_file, args.word_size)
+                single_out = os.path.isfile(args.out_array_file) and os.path.getsize(args.out_array_file) == record_size
+                if single_out:
+                    # Repeat the only 'out' record for every 'in' record
+                    out_reader.read_chunk()
+                    template = bytes(out_reader.view[:record_size])
+                while True:
+                    with timed(profiler, "read_records"):
+                        n = in_reader.read_chunk()
+                        if n == 0:
+                            break
+                        if single_out:
+                            out_reader.view[:n * record_size] = template * n
+                        elif out_reader.read_chunk() < n:
+                            raise ValueError(f"'{args.out_array_file}' has fewer records than '{args.in_array_file}'")
+                    with timed(profiler, "native_call"):
+                        status = program.run_batch_buffer(in_reader.buffer, out_reader.buffer, n)
+                    with timed(profiler, "write_records"):
+                        output.write(out_reader.view[:n * record_size])
+                    results.update(status)
+                    if status_file:
+                        status_file.write(status)
+    finally:
+        if status_file:
+            status_file.close()
+    if profiler is not None:
+        profiler.add_counters(program.counters())
+    return results
+
+def print_result(args : argparse.Namespace, bytecode : list[list[int]], in_array : list[int], out_array : list[int], result : int,
+                 profiler : Profiler = None) -> None:
+    """Print the outcome of a run, with the bytecode and the profile if any."""
+    if not args.no_bytecode:
+        print("Bytecode:", bytecode)
+    print("In array:", in_array)
+    print("Out array:", out_array)
+    print("Result:", result)
+    if profiler is not None:
+        print("Profile:", profiler.to_json())
+
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: bytecode-compiler <assembly_file> <in_array_file> <out_array_file> <stack_size>")
-        sys.exit(1)
-    assembly_file = sys.argv[1]
-    in_array_file = sys.argv[2]
-    out_array_file = sys.argv[3]
+    args = parse_args()
+    assembly_file = args.assembly_file
+    in_array_file = args.in_array_file
+    out_array_file = args.out_array_file
+    profiler = Profiler() if args.profile else None
     
     # Read assembly instructions
     try:
-        with open(assembly_file, 'r') as f:
+        with timed(profiler, "read_assembly"), open(assembly_file, 'r') as f:
             assembly_code = f.read()
     except FileNotFoundError:
         print(f"Error: File '{assembly_file}' not found.")
         sys.exit(1)
 
     try:
-        bytecode = parse_assembly(assembly_code)
+        with timed(profiler, "parse_assembly"):
+            bytecode = parse_assembly(assembly_code)
     except ValueError as e:
         print(f"Error parsing assembly file: {e}")
         sys.exit(1)
 
+    if args.peephole:
+        with timed(profiler, "peephole"):
+            bytecode, report = optimize_bytecode(bytecode, capacity=args.capacity)
+        if report["skipped"]:
+            print(f"Peephole: skipped ({report['skipped']})")
+        else:
+            print(f"Peephole: {report['before']} -> {report['after']} instructions", report["removed"])
+
+    if args.stream and (args.check or args.connect):
+        print("Error: --stream cannot be combined with --check or --connect")
+        sys.exit(1)
+
+    # The daemon compiles with its own options
+    if args.connect and (args.opt or args.mcpu or args.mattr or args.byteorder != "big"):
+        print("Error: --opt, --mcpu, --mattr and --byteorder are options of the daemon, not of --connect")
+        sys.exit(1)
+
+    if args.stream:
+        try:
+            results = run_stream(bytecode, args, profiler)
+        except FileNotFoundError as e:
+            print(f"Error: File '{e.filename}' not found.")
+            sys.exit(1)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print("Records:", sum(results.values()))
+        print("Results:", dict(sorted(results.items())))
+        if profiler is not None:
+            print("Profile:", profiler.to_json())
+        return
+
     # Read 'in' and 'out' arrays
     try:
-        in_array = read_array_from_file(in_array_file)
+        with timed(profiler, "read_arrays"):
+            in_array = read_array_from_file(in_array_file, args.word_size)
     except (FileNotFoundError, ValueError) as e:
         print(f"Error reading 'in' array: {e}")
         sys.exit(1)
 
     try:
-        out_array = read_array_from_file(out_array_file)
+        with timed(profiler, "read_arrays"):
+            out_array = read_array_from_file(out_array_file, args.word_size)
     except (FileNotFoundError, ValueError) as e:
         print(f"Error reading 'out' array: {e}")
         sys.exit(1)
 
-    # Generate the LLVM module
-    module = compile_bytecode(bytecode)
+    if args.check:
+        error = check_stack(bytecode, args.capacity)
+        print(f"OK: {len(bytecode)} instructions")
+        if error:
+            print(f"Stack: {error} (the program returns an error code)")
+        return
+
+    if args.connect:
+        from bytecode_compiler.client import run_remote
+        from bytecode_compiler.differential import to_assembly
+        try:
+            with timed(profiler, "remote_run"):
+                result, out_array = run_remote(args.connect, to_assembly(bytecode), in_array, out_array,
+                                               word_size=args.word_size, capacity=args.capacity)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print_result(args, bytecode, in_array, out_array, result, profiler)
+        return
+
+    from bytecode_compiler.compiler import compile_bytecode, create_target_machine
+    from bytecode_compiler.execution import execute
+
+    # Generate (and optimise) the LLVM module
+    with timed(profiler, "target_machine"):
+        target_machine = create_target_machine(args.opt, args.mcpu, args.mattr)
+    try:
+        module = compile_bytecode(bytecode, byteorder=args.byteorder, opt_level=args.opt, target_machine=target_machine,
+                                  instrument=args.profile, profiler=profiler, word_size=args.word_size, capacity=args.capacity)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     # Execute the module
-    result, in_array, out_array = execute(in_array, out_array, module)
+    result, in_array, out_array = execute(in_array, out_array, module, args.byteorder, target_machine=target_machine, profiler=profiler,
+                                          word_size=args.word_size)
     
     # Print the generated LLVM IR
-    print("Generated LLVM IR:")
-    print(module)
-    
-    print("Bytecode:", bytecode)
-    print("In array:", in_array)
-    print("Out array:", out_array)
-    print("Result:", result)
+    if not args.no_ir:
+        print("Generated LLVM IR:")
+        print(module)
+    print_result(args, bytecode, in_array, out_array, result, profiler)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,34 @@
+import json
+import socket
+
+# A thin client of the service (see service.serve) for short-lived
+# processes: it only needs the standard library, so it starts without
+# loading LLVM.
+
+def request(path : str, message : dict, timeout : float = None) -> dict:
+    """Send one request to a service listening on the Unix socket 'path' and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f"The service on '{path}' closed the connection without answering")
+    return json.loads(line)
+
+def run_remote(path : str, assembly : str, in_array : list[int], out_array : list[int], timeout : float = None,
+               word_size : int = None, capacity : int = None) -> tuple[int, list[int]]:
+    """Run the assembly on the service listening on 'path' and return (result, out_array).
+    With 'word_size' or 'capacity', the service rejects the request unless it
+    runs with the same ones. Errors reported by the service raise a ValueError."""
+    message = {"program": assembly, "in": in_array, "out": out_array}
+    if word_size is not None:
+        message["word_size"] = word_size
+    if capacity is not None:
+        message["capacity"] = capacity
+    response = request(path, message, timeout)
+    if "error" in response:
+        raise ValueError(response["error"])
+    return response["result"], response["out"]
@@ -1,30 +1,302 @@
+import sys
+import threading
+from time import perf_counter
 from llvmlite import ir, binding
-from bytecode_compiler.utils import i8, i32, i8ptr, i256ptr, genFun
+from bytecode_compiler.utils import i8, i32, i64, i8ptr, stack_type, genFun
 from bytecode_compiler.stack import genStack
+from bytecode_compiler.parser import max_array_size, word_size, capacity, get_record_size, check_layout, byteorders, errCode, stack_effects
+from bytecode_compiler.profiling import Profiler, timed, counter_names, opcode_names, result_codes
+
+_initialized = False
+_init_lock = threading.Lock()
 
 def initBinding():
-    """Initialize LLVM."""
+    """Initialize LLVM (only once per process, thread-safe)."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
     
-    # Initialize the new binding context
-    binding.initialize()
-    binding.initialize_native_target()
-    binding.initialize_native_asmprinter()  # Required for JIT compilation
+        # Initialize the new binding context
+        binding.initialize()
+        binding.initialize_native_target()
+        binding.initialize_native_asmprinter()  # Required for JIT compilation
+        _initialized = True
 
-def compile_bytecode(bytecode : list[list[int]]) -> ir.Module:
-    """Generate LLVM IR code from bytecode."""
-    
-    # Initialize LLVM
+def create_target_machine(opt_level : int = 2, cpu : str = "", features : str = "", reloc : str = "default") -> binding.TargetMachine:
+    """Create a target machine for the host triple. 'cpu' may be "native" to
+    target the host CPU (and, unless 'features' is given, its features).
+    'reloc' is the relocation model ("pic" for shared libraries)."""
+    initBinding()
+    if cpu == "native":
+        cpu = binding.get_host_cpu_name()
+        features = features or binding.get_host_cpu_features().flatten()
+    target = binding.Target.from_default_triple()
+    target_machine = target.create_target_machine(cpu=cpu, features=features, opt=opt_level, reloc=reloc)
+    target_machine.options = {"opt_level": opt_level, "cpu": cpu, "features": features, "reloc": reloc}
+    return target_machine
+
+def copy_target_machine(target_machine : binding.TargetMachine = None) -> binding.TargetMachine:
+    """Create a target machine with the options of one made by
+    create_target_machine (a default one otherwise). An execution engine
+    frees its target machine, so each engine needs its own."""
+    return create_target_machine(**getattr(target_machine, "options", {}))
+
+def to_llvm_module(module) -> binding.ModuleRef:
+    """Return the module as a verified LLVM module, parsing its IR if needed."""
+    if isinstance(module, binding.ModuleRef):
+        return module
+    llvm_mod = binding.parse_assembly(str(module))
+    llvm_mod.verify()
+    return llvm_mod
+
+def optimize(module, opt_level : int = 2, target_machine : binding.TargetMachine = None) -> binding.ModuleRef:
+    """Run the LLVM optimisation pipeline of 'opt_level' (0 to 3) over the module.
+    From level 1 the stack helpers are inlined into the program."""
+    if opt_level not in (0, 1, 2, 3):
+        raise ValueError(f"Optimisation level must be between 0 and 3, got {opt_level}")
+    llvm_mod = to_llvm_module(module)
+    if opt_level == 0:
+        return llvm_mod
+    if target_machine is None:
+        target_machine = create_target_machine(opt_level)
+
+    if hasattr(binding, "create_pass_builder"):
+        pto = binding.PipelineTuningOptions(speed_level=opt_level, size_level=0)
+        pass_builder = binding.create_pass_builder(target_machine, pto)
+        pass_builder.getModulePassManager().run(llvm_mod, pass_builder)
+    else:
+        # Older llvmlite versions only have the legacy pass managers
+        pmb = binding.create_pass_manager_builder()
+        pmb.opt_level = opt_level
+        pmb.inlining_threshold = 275 if opt_level == 3 else 225
+        pass_manager = binding.create_module_pass_manager()
+        target_machine.add_analysis_passes(pass_manager)
+        pmb.populate(pass_manager)
+        pass_manager.run(llvm_mod)
+    return llvm_mod
+
+def genBatch(module : ir.Module, function : ir.Function, word_size : int = word_size) -> ir.Function:
+    """Define '<function>_batch(in, out, n, status)', which runs 'function' over
+    n contiguous 'in'/'out' records of words of 'word_size' bits and stores
+    each result code into status[i].
+    Arguments of 'function' before 'in' and 'out' (such as the program id of
+    a library) come first and are passed through."""
+
+    leading_types = [arg.type for arg in function.args[:-2]]
+    batch_func = genFun(module, f"{function.name}_batch", ir.VoidType(), leading_types + [i8ptr, i8ptr, i64, i8ptr])
+    *leading_args, in_arg, out_arg, n_arg, status_arg = batch_func.args
+    in_arg.name = "in"
+    out_arg.name = "out"
+    n_arg.name = "n"
+    status_arg.name = "status"
+
+    entry = batch_func.append_basic_block(name="entry")
+    loop = batch_func.append_basic_block(name="loop")
+    body = batch_func.append_basic_block(name="body")
+    exit = batch_func.append_basic_block(name="exit")
+    builder = ir.IRBuilder(entry)
+    builder.branch(loop)
+
+    # Loop over the records
+    builder.position_at_end(loop)
+    index = builder.phi(i64, name="index")
+    index.add_incoming(i64(0), entry)
+    done = builder.icmp_unsigned(">=", index, n_arg, name="done")
+    builder.cbranch(done, exit, body)
+
+    # Run the program on record 'index'
+    builder.position_at_end(body)
+    offset = builder.mul(index, i64(get_record_size(word_size)), name="offset")
+    in_record = builder.gep(in_arg, [offset], name="in_record")
+    out_record = builder.gep(out_arg, [offset], name="out_record")
+    result = builder.call(function, [*leading_args, in_record, out_record], name="result")
+    builder.store(result, builder.gep(status_arg, [index], name="status_ptr"))
+    next_index = builder.add(index, i64(1), name="next_index")
+    index.add_incoming(next_index, body)
+    builder.branch(loop)
+
+    builder.position_at_end(exit)
+    builder.ret_void()
+
+    return batch_func
+
+def split_fragments(bytecode : list[list[int]], min_size : int = 64, capacity : int = capacity) -> list[list[list[int]]]:
+    """Split the bytecode (up to STOP, excluded) into fragments of at least
+    'min_size' instructions that start and end with an empty stack, so each
+    can be compiled on its own (see genLinker). Programs sharing a prefix
+    share the fragments of that prefix. After a stack error (with a stack
+    of 'capacity' words), the rest of the program stays in one fragment."""
+    fragments = []
+    fragment = []
+    depth = 0
+    for opcode, *args in bytecode:
+        if opcode == 0x00:
+            break
+        fragment.append([opcode, *args])
+        if depth is not None:
+            pops, pushes = stack_effects[opcode]
+            depth = depth - pops + pushes if pops <= depth and depth - pops + pushes <= capacity else None
+        if depth == 0 and len(fragment) >= min_size:
+            fragments.append(fragment)
+            fragment = []
+    if fragment:
+        fragments.append(fragment)
+    return fragments
+
+def genLinker(name : str, fragment_names : list[str], batch : bool = False, word_size : int = word_size) -> ir.Module:
+    """Generate a module exporting 'name', which calls the compiled fragments
+    (functions with the signature of a program, see split_fragments) in
+    order and returns the first nonzero result code, or 0.
+    With 'batch', also export '<name>_batch' for words of 'word_size' bits
+    (see genBatch)."""
     initBinding()
-    
-    # Create a module
     module = ir.Module(name="bytecode_compiler")
-    
-    # Define a global variable to act as an error flag
-    error_flag = ir.GlobalVariable(module, ir.IntType(1), name="error_flag")
-    error_flag.initializer = ir.Constant(ir.IntType(1), 0)
-    
+    function = genFun(module, name, i8, [i8ptr, i8ptr])
+    in_arg, out_arg = function.args
+    in_arg.name = "in"
+    out_arg.name = "out"
+    builder = ir.IRBuilder(function.append_basic_block(name="entry"))
+    for fragment_name in fragment_names:
+        fragment = module.globals.get(fragment_name) or genFun(module, fragment_name, i8, [i8ptr, i8ptr])
+        result = builder.call(fragment, [in_arg, out_arg], name="result")
+        with builder.if_then(builder.icmp_unsigned("!=", result, i8(0))):
+            builder.ret(result)
+    builder.ret(i8(0))
+    if batch:
+        genBatch(module, function, word_size)
+    return module
+
+def genSimd(module : ir.Module, bytecode : list[list[int]], name : str, lanes : int,
+            word_size : int = word_size, capacity : int = capacity) -> ir.Function:
+    """Define '<name>_simd(in, out, nblocks)', which runs the bytecode over
+    nblocks blocks of 'lanes' records each, all lanes at once.
+
+    Blocks use a limb-sliced layout (see execution.to_simd_layout): for each
+    word and each of its 64-bit limbs, least significant first, the limbs of
+    the 'lanes' records are contiguous native u64s. Words are thus vectors of
+    limbs, and ADD and SUB become carry chains of <lanes x i64> operations.
+    The stack is simulated at compile time, so a program that may fail with a
+    stack error raises a ValueError; every record then has result code 0."""
+    limbs = word_size // 64
+    vector = ir.VectorType(i64, lanes)
+    vector_ptr = ir.PointerType(vector)
+    block_limbs = max_array_size * limbs * lanes
+
+    # Export the number of lanes, so callers can check their layout against it
+    lanes_global = ir.GlobalVariable(module, i64, f"{name}_simd_lanes")
+    lanes_global.initializer = i64(lanes)
+    lanes_global.global_constant = True
+
+    simd_func = genFun(module, f"{name}_simd", ir.VoidType(), [i8ptr, i8ptr, i64])
+    in_arg, out_arg, nblocks_arg = simd_func.args
+    in_arg.name = "in"
+    out_arg.name = "out"
+    nblocks_arg.name = "nblocks"
+
+    entry = simd_func.append_basic_block(name="entry")
+    loop = simd_func.append_basic_block(name="loop")
+    body = simd_func.append_basic_block(name="body")
+    exit = simd_func.append_basic_block(name="exit")
+    builder = ir.IRBuilder(entry)
+    # Address the buffers as u64s: the allocation size of <lanes x i64> is
+    # padded to a power of two, so vector pointers cannot step through them
+    in_limbs = builder.bitcast(in_arg, i64.as_pointer())
+    out_limbs = builder.bitcast(out_arg, i64.as_pointer())
+    builder.branch(loop)
+
+    # Loop over the blocks
+    builder.position_at_end(loop)
+    index = builder.phi(i64, name="index")
+    index.add_incoming(i64(0), entry)
+    done = builder.icmp_unsigned(">=", index, nblocks_arg, name="done")
+    builder.cbranch(done, exit, body)
+
+    builder.position_at_end(body)
+    offset = builder.mul(index, i64(block_limbs), name="offset")
+    in_block = builder.gep(in_limbs, [offset], name="in_block")
+    out_block = builder.gep(out_limbs, [offset], name="out_block")
+
+    def limb_ptr(block : ir.Value, word : int, limb : int) -> ir.Value:
+        return builder.bitcast(builder.gep(block, [i64((word * limbs + limb) * lanes)]), vector_ptr)
+
+    def carry(value : ir.Value, bound : ir.Value, sub : bool) -> ir.Value:
+        # The carry (or borrow) out of 'value = bound + x' (or 'bound - x'), as 0 or 1 in each lane
+        overflow = builder.icmp_unsigned(">" if sub else "<", value, bound)
+        return builder.zext(overflow, vector)
+
+    def add_sub(value1 : list[ir.Value], value2 : list[ir.Value], sub : bool) -> list[ir.Value]:
+        op = builder.sub if sub else builder.add
+        result = []
+        carry_in = None
+        for limb1, limb2 in zip(value1, value2):
+            partial = op(limb1, limb2)
+            carry_out = carry(partial, limb1, sub)
+            if carry_in is not None:
+                limb = op(partial, carry_in)
+                carry_out = builder.or_(carry_out, carry(limb, partial, sub))
+                partial = limb
+            result.append(partial)
+            carry_in = carry_out
+        return result
+
+    values = []
+    for i, (opcode, *args) in enumerate(bytecode):
+        if opcode == 0x00:
+            # STOP
+            break
+        elif opcode == 0x01:
+            # LOAD
+            if len(values) >= capacity:
+                raise ValueError(f"Stack overflow at instruction {i}")
+            values.append([builder.load(limb_ptr(in_block, args[0], limb), align=8) for limb in range(limbs)])
+        elif opcode == 0x02:
+            # STORE
+            if not values:
+                raise ValueError(f"Stack underflow at instruction {i}")
+            for limb in range(limbs):
+                builder.store(values[-1][limb], limb_ptr(out_block, args[0], limb), align=8)
+        elif opcode == 0x03:
+            # POP
+            if not values:
+                raise ValueError(f"Stack underflow at instruction {i}")
+            values.pop()
+        elif opcode == 0x04 or opcode == 0x05:
+            # ADD, SUB
+            if len(values) < 2:
+                raise ValueError(f"Stack underflow at instruction {i}")
+            value2 = values.pop()
+            value1 = values.pop()
+            values.append(add_sub(value1, value2, opcode == 0x05))
+        elif opcode == 0x06:
+            # DUP
+            if not values:
+                raise ValueError(f"Stack underflow at instruction {i}")
+            if len(values) >= capacity:
+                raise ValueError(f"Stack overflow at instruction {i}")
+            values.append(values[-1])
+        else:
+            raise ValueError(f"Unknown opcode {opcode} at index {i}")
+
+    next_index = builder.add(index, i64(1), name="next_index")
+    index.add_incoming(next_index, builder.block)
+    builder.branch(loop)
+
+    builder.position_at_end(exit)
+    builder.ret_void()
+
+    return simd_func
+
+def genProgram(module : ir.Module, bytecode : list[list[int]], name : str = "function", byteorder : str = "big", promote_stack : bool = False,
+               instrument : bool = False, runtime : bool = False, word_size : int = word_size, capacity : int = capacity) -> ir.Function:
+    """Define the function 'name(in, out)' running the bytecode in the module
+    (see compile_bytecode for the options). Programs of one module share
+    their stack helpers."""
+
     # Define the function type
-    function = genFun(module, "function", i8, [i8ptr, i8ptr])
+    function = genFun(module, name, i8, [i8ptr, i8ptr])
 
     # Get the arguments (and name them)
     in_arg, out_arg = function.args
@@ -34,61 +306,106 @@ def compile_bytecode(bytecode : list[list[int]]) -> ir.Module:
     # Create an entry block
     block = function.append_basic_block(name="entry")
     builder = ir.IRBuilder(block)
+    word = ir.IntType(word_size)
     
-    # Cast 'in' from i8* to i256*
-    in_ptr = builder.bitcast(in_arg, i256ptr)
+    # Cast 'in' from i8* to iN*
+    in_ptr = builder.bitcast(in_arg, word.as_pointer())
     
-    # Cast 'out' from i8* to i256*
-    out_ptr = builder.bitcast(out_arg, i256ptr)
+    # Cast 'out' from i8* to iN*
+    out_ptr = builder.bitcast(out_arg, word.as_pointer())
 
-    # Generate the stack
-    stack, peek_func, push_func, pop_func = genStack(module, builder, error_flag)
-    
-    errCode = { "full": 1, "empty": 2 }
-    def check_error(type : str):
-        # Check the error flag
-        error = builder.load(error_flag)
-        with builder.if_then(error):
-            # reset the error flag
-            builder.store(ir.Constant(ir.IntType(1), 0), error_flag)
-            # exit the function
-            builder.ret(i8(errCode[type]))
-            
-    def genPush(value):
-        builder.call(push_func, [stack, value])
-        check_error("full")
-        
-    def genPop() -> ir.Value:
-        value = builder.call(pop_func, [stack])
-        check_error("empty")
-        return value
-        
-    def genPeek() -> ir.Value:
-        value = builder.call(peek_func, [stack])
-        check_error("empty")
-        return value
+    opcode_counts = result_counts = None
+    if instrument:
+        # Define the counters, zeroed
+        opcode_counts, result_counts = (
+            ir.GlobalVariable(module, ir.ArrayType(i64, len(names)), name=counter)
+            for counter, names in zip(counter_names(name), (opcode_names, result_codes)))
+        for counts in (opcode_counts, result_counts):
+            counts.initializer = ir.Constant(counts.value_type, None)
+
+    def count(counts : ir.GlobalVariable, index : int):
+        # Increment a counter (if instrumented)
+        if instrument:
+            counter = builder.gep(counts, [i32(0), i32(index)])
+            builder.store(builder.add(builder.load(counter), i64(1)), counter)
+
+    # Convert words between the array layout and the native one
+    swap = byteorder != sys.byteorder
+    bswap = module.declare_intrinsic("llvm.bswap", [word]) if swap else None
+    def convert(value : ir.Value) -> ir.Value:
+        return builder.call(bswap, [value]) if swap else value
+
+    if promote_stack:
+        # Simulate the stack at compile time
+        values = []
+
+        def genPush(value):
+            if len(values) >= capacity:
+                raise ValueError(f"Stack overflow at instruction {i}")
+            values.append(value)
+
+        def genPop() -> ir.Value:
+            if not values:
+                raise ValueError(f"Stack underflow at instruction {i}")
+            return values.pop()
+
+        def genPeek() -> ir.Value:
+            if not values:
+                raise ValueError(f"Stack underflow at instruction {i}")
+            return values[-1]
+    else:
+        # The status slot of this invocation, set by the stack helpers on error
+        status = builder.alloca(i8, name="status")
+        builder.store(i8(0), status)
+
+        # Generate the stack
+        stack, peek_func, push_func, pop_func = genStack(module, builder, runtime, stack_type(word_size, capacity))
+
+        def check_error(type : str):
+            # Check the status slot
+            error = builder.icmp_unsigned("!=", builder.load(status), i8(0))
+            with builder.if_then(error):
+                count(result_counts, errCode[type])
+                # exit the function
+                builder.ret(i8(errCode[type]))
+
+        def genPush(value):
+            builder.call(push_func, [stack, value, status])
+            check_error("full")
+
+        def genPop() -> ir.Value:
+            value = builder.call(pop_func, [stack, status])
+            check_error("empty")
+            return value
+
+        def genPeek() -> ir.Value:
+            value = builder.call(peek_func, [stack, status])
+            check_error("empty")
+            return value
     
     # Generate the function body
     for i, (opcode, *args) in enumerate(bytecode):
+        count(opcode_counts, opcode)
         if opcode == 0x00:
             # STOP
+            count(result_counts, 0)
             builder.ret(i8(0))
-            return module
+            break
         elif opcode == 0x01:
             # LOAD
             index = args[0]
             idx_ptr = builder.gep(in_ptr, [ir.Constant(i32, index)], name="idx_ptr")
-            value = builder.load(idx_ptr, name="value")
+            value = convert(builder.load(idx_ptr, name="value"))
             genPush(value)
         elif opcode == 0x02:
             # STORE
             index = args[0]
             idx_ptr = builder.gep(out_ptr, [ir.Constant(i32, index)], name="idx_ptr")
             value = genPeek()
-            builder.store(value, idx_ptr)
+            builder.store(convert(value), idx_ptr)
         elif opcode == 0x03:
             # POP
-            builder.call(pop_func, [stack])
+            genPop()
         elif opcode == 0x04:
             # ADD
             value2 = genPop()
@@ -100,10 +417,114 @@ def compile_bytecode(bytecode : list[list[int]]) -> ir.Module:
             value2 = genPop()
             value1 = genPop()
             result = builder.sub(value1, value2)
-            builder.call(push_func, [stack, result])
+            genPush(result)
         elif opcode == 0x06:
             # DUP
             value = genPeek()
-            builder.call(push_func, [stack, value])
+            genPush(value)
         else:
             raise ValueError(f"Unknown opcode {opcode} at index {i}")
+    else:
+        # The function would run off its end
+        raise ValueError("The bytecode has no STOP instruction")
+
+    return function
+
+def compile_bytecode(bytecode : list[list[int]], name : str = "function", batch : bool = False, byteorder : str = "big", promote_stack : bool = False,
+                     opt_level : int = 0, target_machine : binding.TargetMachine = None, simd_lanes : int = 0,
+                     instrument : bool = False, profiler : Profiler = None, runtime : bool = False,
+                     word_size : int = word_size, capacity : int = capacity) -> ir.Module | binding.ModuleRef:
+    """Generate LLVM IR code from bytecode, exporting it as the function 'name'.
+    batch: also export '<name>_batch' (see genBatch).
+    byteorder: layout of the words in the arrays, byte-swapped on LOAD and STORE if not native.
+    promote_stack: keep the stack in SSA values; stack errors raise a ValueError at compile time.
+    opt_level, target_machine: optimise the module (see optimize) and return it as an LLVM module.
+    simd_lanes: also export '<name>_simd', running that many records at once (see genSimd).
+    instrument: count the instructions run and the results (see profiling.read_counters).
+    profiler: times the "ir_build" and "optimize" phases.
+    runtime: only declare the stack helpers, to be linked with stack.genRuntime.
+    word_size, capacity: bits per word (wrapping around) and maximum stack depth."""
+    if byteorder not in byteorders:
+        raise ValueError(f"Unknown byte order '{byteorder}', expected one of {byteorders}")
+    check_layout(word_size, capacity)
+    if simd_lanes < 0:
+        raise ValueError(f"The number of SIMD lanes must not be negative, got {simd_lanes}")
+    
+    # Initialize LLVM
+    initBinding()
+    start = perf_counter()
+    
+    # Create a module
+    module = ir.Module(name="bytecode_compiler")
+    function = genProgram(module, bytecode, name, byteorder, promote_stack, instrument, runtime, word_size, capacity)
+
+    if batch:
+        genBatch(module, function, word_size)
+    if simd_lanes:
+        genSimd(module, bytecode, name, simd_lanes, word_size, capacity)
+    if profiler is not None:
+        profiler.add("ir_build", perf_counter() - start)
+
+    if opt_level:
+        with timed(profiler, "optimize"):
+            return optimize(module, opt_level, target_machine)
+    return module
+
+
+def compile_library(bytecodes : list[list[list[int]]], name : str = "library", byteorder : str = "big", promote_stack : bool = False,
+                    opt_level : int = 0, target_machine : binding.TargetMachine = None,
+                    word_size : int = word_size, capacity : int = capacity) -> ir.Module | binding.ModuleRef:
+    """Generate one module holding all the programs, each in its own function
+    sharing the stack helpers, and a table of pointers to them. The module
+    exports 'name(i32 id, in, out)', which runs program 'id' and returns its
+    result code (errCode["invalid"] for an unknown id), and '<name>_batch'
+    (see genBatch). The options are those of compile_bytecode."""
+    if byteorder not in byteorders:
+        raise ValueError(f"Unknown byte order '{byteorder}', expected one of {byteorders}")
+    check_layout(word_size, capacity)
+    initBinding()
+    module = ir.Module(name="bytecode_compiler")
+
+    # Generate the programs
+    programs = []
+    for i, bytecode in enumerate(bytecodes):
+        try:
+            program = genProgram(module, bytecode, f"{name}_program_{i}", byteorder, promote_stack,
+                                 word_size=word_size, capacity=capacity)
+        except ValueError as e:
+            raise ValueError(f"Program {i}: {e}")
+        program.linkage = "internal"
+        programs.append(program)
+
+    # Generate the dispatch table
+    program_ptr = ir.FunctionType(i8, [i8ptr, i8ptr]).as_pointer()
+    table_type = ir.ArrayType(program_ptr, len(programs))
+    table = ir.GlobalVariable(module, table_type, name=f"{name}_table")
+    table.initializer = ir.Constant(table_type, programs)
+    table.global_constant = True
+    table.linkage = "internal"
+
+    # Generate the entry point
+    function = genFun(module, name, i8, [i32, i8ptr, i8ptr])
+    id_arg, in_arg, out_arg = function.args
+    id_arg.name = "id"
+    in_arg.name = "in"
+    out_arg.name = "out"
+    entry = function.append_basic_block(name="entry")
+    call = function.append_basic_block(name="call")
+    invalid = function.append_basic_block(name="invalid")
+    builder = ir.IRBuilder(entry)
+    builder.cbranch(builder.icmp_unsigned("<", id_arg, i32(len(programs)), name="valid"), call, invalid)
+
+    builder.position_at_end(call)
+    program = builder.load(builder.gep(table, [i32(0), id_arg], name="program_ptr"), name="program")
+    builder.ret(builder.call(program, [in_arg, out_arg], name="result"))
+
+    builder.position_at_end(invalid)
+    builder.ret(i8(errCode["invalid"]))
+
+    genBatch(module, function, word_size)
+
+    if opt_level:
+        return optimize(module, opt_level, target_machine)
+    return module
@@ -0,0 +1,117 @@
+import random
+from time import perf_counter
+from bytecode_compiler.parser import cmd2opcode, max_array_size, word_size, capacity
+from bytecode_compiler.interpreter import interpret
+
+opcode2cmd = {opcode: cmd for cmd, (opcode, _) in cmd2opcode.items()}
+
+def to_assembly(bytecode : list[list[int]]) -> str:
+    """Convert bytecode back to assembly text."""
+    return "\n".join(" ".join([opcode2cmd[opcode]] + [str(arg) for arg in args]) for opcode, *args in bytecode)
+
+def random_program(rng : random.Random, length : int, error_rate : float = 0.0, capacity : int = capacity) -> list[list[int]]:
+    """Generate a random program of 'length' instructions followed by STOP.
+    Instructions keep the stack within bounds, except that each one is drawn
+    regardless of the stack depth (and may thus fail) with probability 'error_rate'."""
+    bytecode = []
+    depth = 0
+    while len(bytecode) < length:
+        if rng.random() < error_rate:
+            opcode = rng.randint(0x01, 0x06)
+        else:
+            choices = []
+            if depth < capacity:
+                choices += [0x01, 0x01]
+                if depth >= 1:
+                    choices.append(0x06)
+            if depth >= 1:
+                choices += [0x02, 0x02, 0x03]
+            if depth >= 2:
+                choices += [0x04, 0x05, 0x04, 0x05]
+            opcode = rng.choice(choices)
+        if opcode in (0x01, 0x02):
+            bytecode.append([opcode, rng.randrange(max_array_size)])
+        else:
+            bytecode.append([opcode])
+        depth = max(0, depth + {0x01: 1, 0x02: 0, 0x03: -1, 0x04: -1, 0x05: -1, 0x06: 1}[opcode])
+    bytecode.append([0x00])
+    return bytecode
+
+def random_array(rng : random.Random, word_size : int = word_size) -> list[int]:
+    """Generate a random array of words of 'word_size' bits, mixing small, large and edge values."""
+    edges = [0, 1, (1 << word_size) - 1, 1 << (word_size - 1)]
+    array = []
+    for _ in range(max_array_size):
+        kind = rng.random()
+        if kind < 0.4:
+            array.append(rng.randrange(256))
+        elif kind < 0.8:
+            array.append(rng.getrandbits(word_size))
+        else:
+            array.append(rng.choice(edges))
+    return array
+
+def differential_test(engine = None, programs : int = 50, lengths : list[int] = (10, 100), runs : int = 10,
+                      error_rate : float = 0.02, seed : int = 0) -> dict:
+    """Run random programs through both the interpreter and the JIT 'engine'
+    (a default Engine if None), check that they agree, and time both backends.
+
+    Returns a report with the mismatching cases and, for each program length,
+    the mean time of an interpreted run, a JIT compile and a JIT run.
+    Programs and arrays follow the word size and capacity of the engine.
+    An engine that rejects a program at compile time (e.g. with stack
+    promotion) agrees with the interpreter when every run of it fails."""
+    if engine is None:
+        from bytecode_compiler.engine import Engine
+        engine = Engine()
+    word_size, capacity = engine.word_size, engine.capacity
+    rng = random.Random(seed)
+    mismatches = []
+    latency = []
+    for length in lengths:
+        interpreter_time = compile_time = jit_time = 0.0
+        jit_runs = 0
+        for _ in range(programs):
+            bytecode = random_program(rng, length, error_rate, capacity)
+            start = perf_counter()
+            try:
+                program = engine.compile(bytecode)
+                error = None
+            except ValueError as e:
+                program = None
+                error = str(e)
+            compile_time += perf_counter() - start
+            for _ in range(runs):
+                in_array = random_array(rng, word_size)
+                out_array = random_array(rng, word_size)
+
+                start = perf_counter()
+                expected = interpret(bytecode, in_array, out_array, word_size, capacity)
+                interpreter_time += perf_counter() - start
+
+                if program is None:
+                    if expected[0] == 0:
+                        mismatches.append({"program": to_assembly(bytecode), "in": in_array, "out": out_array,
+                                           "interpreter": [expected[0], expected[2]], "jit": error})
+                    continue
+
+                start = perf_counter()
+                actual = program.run(in_array, out_array)
+                jit_time += perf_counter() - start
+                jit_runs += 1
+
+                if actual != expected:
+                    mismatches.append({
+                        "program": to_assembly(bytecode),
+                        "in": in_array,
+                        "out": out_array,
+                        "interpreter": [expected[0], expected[2]],
+                        "jit": [actual[0], actual[2]],
+                    })
+        latency.append({
+            "length": length,
+            "interpreter_run": interpreter_time / (programs * runs),
+            "jit_compile": compile_time / programs,
+            "jit_run": jit_time / jit_runs if jit_runs else 0.0,
+        })
+    return {"programs": programs * len(lengths), "runs": runs, "mismatches": mismatches, "latency": latency}
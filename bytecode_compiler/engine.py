@@ -0,0 +1,376 @@
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+import llvmlite.binding as binding
+from llvmlite import ir
+from bytecode_compiler.stack import genRuntime
+from bytecode_compiler.utils import stack_type
+from bytecode_compiler.compiler import compile_bytecode, create_target_machine, to_llvm_module, optimize, split_fragments, genLinker
+from bytecode_compiler.parser import byteorders, word_size, capacity, check_layout
+from bytecode_compiler.binary import encode
+from bytecode_compiler.peephole import optimize_bytecode, check_stack
+from bytecode_compiler.profiling import counter_names, read_counters_at, resident_bytes
+from bytecode_compiler.execution import func_type, batch_func_type, simd_func_type, call_function, call_batch_function, call_function_buffer, call_batch_function_buffer, call_simd_function, call_simd_function_buffer
+
+def bytecode_hash(bytecode : list[list[int]]) -> str:
+    """Hash the parsed bytecode (through its binary encoding) into a hex digest."""
+    return hashlib.sha256(encode(bytecode)).hexdigest()
+
+class Generation:
+    """One MCJIT execution engine, with its own target machine (which MCJIT
+    owns), and the sizes of the modules compiled into it.
+
+    MCJIT only frees the machine code of a module together with the engine,
+    so the code of removed modules is counted as retired until then. The
+    execution engine is closed when the generation is garbage collected,
+    that is once neither its Engine nor any of its programs refer to it."""
+
+    def __init__(self, opt_level : int = 2, cpu : str = "", features : str = ""):
+        self.target_machine = create_target_machine(opt_level, cpu, features)
+        self.jit = binding.create_mcjit_compiler(binding.parse_assembly(""), self.target_machine)
+
+        # Bytes of object code (reported by MCJIT when it compiles a module)
+        # and of bitcode of the modules in the engine
+        code_sizes = self.code_sizes = {}
+        self.ir_sizes = {}
+        self.jit.set_object_cache(lambda llvm_module, buffer: code_sizes.__setitem__(llvm_module, len(buffer)))
+        self.retired_bytes = 0
+
+        # Compiled fragments: key -> [LLVM module, number of cached programs using it]
+        self.fragments = {}
+        weakref.finalize(self, self.jit.close)
+
+    def add_module(self, llvm_module : binding.ModuleRef) -> None:
+        """Add a module to the engine, which takes ownership of it."""
+        self.ir_sizes[llvm_module] = len(llvm_module.as_bitcode())
+        self.jit.add_module(llvm_module)
+
+    def remove_module(self, llvm_module : binding.ModuleRef) -> None:
+        """Remove a module from the engine and free its IR."""
+        self.jit.remove_module(llvm_module)
+        self.retired_bytes += self.code_sizes.pop(llvm_module, 0)
+        del self.ir_sizes[llvm_module]
+        llvm_module.close()
+
+    def footprint(self, llvm_module : binding.ModuleRef) -> dict:
+        """Return the bytes of object code and of bitcode of a finalized module."""
+        return {"code_bytes": self.code_sizes.get(llvm_module, 0), "ir_bytes": self.ir_sizes.get(llvm_module, 0)}
+
+    def code_bytes(self) -> int:
+        return sum(self.code_sizes.values())
+
+    def ir_bytes(self) -> int:
+        return sum(self.ir_sizes.values())
+
+class CompiledProgram:
+    """A program that has been compiled to native code by an Engine.
+
+    The native code runs without holding the GIL, and keeps its state on
+    the native stack of the call, so a program can run in several threads
+    at once. The program keeps the execution engine holding its code alive."""
+
+    def __init__(self, key : str, name : str, llvm_module : binding.ModuleRef, address : int, byteorder : str = "big",
+                 word_size : int = word_size, generation : Generation = None):
+        self.key = key
+        self.name = name
+        self.llvm_module = llvm_module
+        self.generation = generation
+        self.code_bytes = 0
+        self.ir_bytes = 0
+        self.address = address
+        self.cfunc = func_type(address)
+        self.batch_cfunc = None
+        self.simd_cfunc = None
+        self.simd_lanes = 0
+        self.counter_addresses = None
+        self.fragments = []
+        self.byteorder = byteorder
+        self.word_size = word_size
+
+    def run(self, in_array : list[int], out_array : list[int]) -> tuple[int, list[int], list[int]]:
+        """Run the program with the given 'in' and 'out' arrays."""
+        return call_function(self.cfunc, in_array, out_array, self.byteorder, word_size=self.word_size)
+
+    def run_batch(self, in_records : list[list[int]], out_records : list[list[int]]) -> tuple[list[int], list[list[int]], list[list[int]]]:
+        """Run the program over N 'in'/'out' records in a single native call."""
+        return call_batch_function(self.batch_cfunc, in_records, out_records, self.byteorder, self.word_size)
+
+    def run_buffer(self, in_buffer, out_buffer) -> int:
+        """Run the program directly on 'in' and 'out' buffers, updating 'out_buffer' in place."""
+        return call_function_buffer(self.cfunc, in_buffer, out_buffer, self.word_size)
+
+    def run_batch_buffer(self, in_buffer, out_buffer, n : int = None) -> bytearray:
+        """Run the program directly on buffers of n contiguous records."""
+        return call_batch_function_buffer(self.batch_cfunc, in_buffer, out_buffer, n, self.word_size)
+
+    def counters(self, reset : bool = False) -> dict:
+        """Read (and optionally reset) the opcode and result counters of a
+        program compiled by an Engine with 'instrument=True'."""
+        if self.counter_addresses is None:
+            raise ValueError("The program is not instrumented, compile it with an Engine with 'instrument=True'")
+        return read_counters_at(*self.counter_addresses, reset=reset)
+
+    def check_simd(self) -> None:
+        if self.simd_cfunc is None:
+            raise ValueError("The program has no SIMD entry point: the engine has no 'simd_lanes' or the program may fail with a stack error")
+
+    def run_simd(self, in_records : list[list[int]], out_records : list[list[int]]) -> tuple[list[int], list[list[int]], list[list[int]]]:
+        """Run the program over N 'in'/'out' records, 'simd_lanes' records at a time."""
+        self.check_simd()
+        return call_simd_function(self.simd_cfunc, in_records, out_records, self.simd_lanes, self.word_size)
+
+    def run_simd_buffer(self, in_buffer, out_buffer, nblocks : int) -> None:
+        """Run the program directly on buffers of blocks of records in the SIMD layout."""
+        self.check_simd()
+        call_simd_function_buffer(self.simd_cfunc, in_buffer, out_buffer, nblocks, self.simd_lanes, self.word_size)
+
+class Engine:
+    """A long-lived, thread-safe JIT caching compiled programs by bytecode
+    hash (LRU). Cache hits never wait for a compilation on another thread.
+    cache_size: maximum number of cached programs.
+    byteorder, promote_stack, word_size, capacity: as in compile_bytecode.
+    opt_level, cpu, features: optimisation level and target ("native" for the host CPU).
+    peephole: run optimize_bytecode first (programs stay keyed by the original bytecode).
+    simd_lanes: give programs that cannot fail a SIMD entry point (CompiledProgram.run_simd).
+    instrument: count the instructions programs run (CompiledProgram.counters).
+    fragment_size: compile programs incrementally, in cached fragments (see split_fragments).
+    shared_runtime: link programs against one stack runtime module (default at -O0).
+    code_budget: also evict programs while their code and IR exceed that many bytes.
+    recycle_bytes: start a new execution engine once evicted code exceeds that many bytes."""
+
+    def __init__(self, cache_size : int = 1024, byteorder : str = "big", promote_stack : bool = False,
+                 opt_level : int = 2, cpu : str = "", features : str = "", peephole : bool = False,
+                 simd_lanes : int = 0, instrument : bool = False, fragment_size : int = 0,
+                 shared_runtime : bool = None, word_size : int = word_size, capacity : int = capacity,
+                 code_budget : int = None, recycle_bytes : int = 64 * 2**20):
+        if cache_size < 1:
+            raise ValueError(f"Cache size must be positive, got {cache_size}")
+        if code_budget is not None and code_budget < 1:
+            raise ValueError(f"Code budget must be positive, got {code_budget}")
+        if recycle_bytes < 1:
+            raise ValueError(f"Recycle threshold must be positive, got {recycle_bytes}")
+        if fragment_size < 0:
+            raise ValueError(f"Fragment size must not be negative, got {fragment_size}")
+        if fragment_size and (simd_lanes or instrument):
+            raise ValueError("Incremental compilation does not support 'simd_lanes' or 'instrument'")
+        if byteorder not in byteorders:
+            raise ValueError(f"Unknown byte order '{byteorder}', expected one of {byteorders}")
+        check_layout(word_size, capacity)
+        self.byteorder = byteorder
+        self.word_size = word_size
+        self.capacity = capacity
+        self.promote_stack = promote_stack
+        self.opt_level = opt_level
+        self.peephole = peephole
+        self.simd_lanes = simd_lanes
+        self.instrument = instrument
+        self.fragment_size = fragment_size
+        if shared_runtime is None:
+            # Calls to the shared runtime cannot be inlined, so only use it without optimisation
+            shared_runtime = opt_level == 0
+        self.shared_runtime = shared_runtime
+        self.cpu = cpu
+        self.features = features
+        self.code_budget = code_budget
+        self.recycle_bytes = recycle_bytes
+
+        # Compiled programs, least recently used first
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.recycles = 0
+        self.lock = threading.RLock()
+        self.compile_lock = threading.RLock()
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+        # Create the target machine and the execution engine
+        self.new_generation()
+
+    @property
+    def jit(self) -> binding.ExecutionEngine:
+        return self.generation.jit
+
+    @property
+    def target_machine(self) -> binding.TargetMachine:
+        return self.generation.target_machine
+
+    @property
+    def fragments(self) -> dict:
+        return self.generation.fragments
+
+    def new_generation(self) -> None:
+        """Start a new execution engine, with the shared runtime if any."""
+        self.generation = Generation(self.opt_level, self.cpu, self.features)
+        if self.shared_runtime:
+            runtime = optimize(genRuntime(stack_type(self.word_size, self.capacity)), self.opt_level, self.target_machine)
+            self.generation.add_module(to_llvm_module(runtime))
+
+    def recycle(self) -> None:
+        """Drop the cached programs and start a new execution engine. The old
+        one is freed once its programs are no longer referenced."""
+        with self.compile_lock:
+            self.new_generation()
+            with self.lock:
+                self.evictions += len(self.cache)
+                self.cache.clear()
+                self.recycles += 1
+
+    def add_module(self, module : ir.Module | binding.ModuleRef, key : str, name : str, simd_lanes : int = 0) -> CompiledProgram:
+        """Compile a module into the engine (which takes ownership of an LLVM
+        module) and return its entry point 'name'."""
+        llvm_mod = to_llvm_module(module)
+        with self.compile_lock:
+            generation = self.generation
+            generation.add_module(llvm_mod)
+            self.jit.finalize_object()
+            self.jit.run_static_constructors()
+            program = CompiledProgram(key, name, llvm_mod, self.jit.get_function_address(name), self.byteorder, self.word_size, generation)
+            footprint = generation.footprint(llvm_mod)
+            program.code_bytes = footprint["code_bytes"]
+            program.ir_bytes = footprint["ir_bytes"]
+            batch_address = self.jit.get_function_address(f"{name}_batch")
+            simd_address = self.jit.get_function_address(f"{name}_simd") if simd_lanes else 0
+            counter_addresses = [self.jit.get_global_value_address(counter) for counter in counter_names(name)]
+        if batch_address:
+            program.batch_cfunc = batch_func_type(batch_address)
+        if simd_address:
+            program.simd_cfunc = simd_func_type(simd_address)
+            program.simd_lanes = simd_lanes
+        if all(counter_addresses):
+            program.counter_addresses = counter_addresses
+        return program
+
+    def compile(self, bytecode : list[list[int]]) -> CompiledProgram:
+        """Return the compiled program for the bytecode, compiling it on a cache miss."""
+        key = bytecode_hash(bytecode)
+        program = self.lookup(key)
+        if program is not None:
+            return program
+
+        with self.compile_lock:
+            # Another thread may have compiled the program in the meantime
+            program = self.lookup(key)
+            if program is not None:
+                return program
+            with self.lock:
+                self.misses += 1
+            if self.generation.retired_bytes > self.recycle_bytes:
+                self.recycle()
+            name = f"function_{key[:16]}"
+            if self.peephole:
+                bytecode, _ = optimize_bytecode(bytecode, capacity=self.capacity)
+            # Only programs that cannot fail get a SIMD entry point
+            simd_lanes = self.simd_lanes if self.simd_lanes and check_stack(bytecode, self.capacity) is None else 0
+            if self.fragment_size:
+                fragments = self.add_fragments(bytecode)
+                module = genLinker(name, [f"fragment_{fragment_key[:16]}" for fragment_key in fragments], batch=True, word_size=self.word_size)
+                program = self.add_module(optimize(module, self.opt_level, self.target_machine), key, name)
+                program.fragments = fragments
+            else:
+                module = compile_bytecode(bytecode, name=name, batch=True, byteorder=self.byteorder, promote_stack=self.promote_stack,
+                                          opt_level=self.opt_level, target_machine=self.target_machine, simd_lanes=simd_lanes,
+                                          instrument=self.instrument, runtime=self.shared_runtime, word_size=self.word_size, capacity=self.capacity)
+                program = self.add_module(module, key, name, simd_lanes)
+
+            with self.lock:
+                self.cache[key] = program
+                # Evict the least recently used programs (but the new one)
+                while len(self.cache) > self.cache_size or (len(self.cache) > 1 and self.over_budget()):
+                    _, evicted = self.cache.popitem(last=False)
+                    self.remove_module(evicted.llvm_module)
+                    self.release_fragments(evicted.fragments)
+                    self.evictions += 1
+            return program
+
+    def __contains__(self, bytecode : list[list[int]]) -> bool:
+        """Return whether the compiled program of the bytecode is cached."""
+        return bytecode_hash(bytecode) in self.cache
+
+    def lookup(self, key : str) -> CompiledProgram | None:
+        """Return the cached program of a bytecode hash, counting a hit, or None."""
+        with self.lock:
+            program = self.cache.get(key)
+            if program is not None:
+                self.hits += 1
+                self.cache.move_to_end(key)
+            return program
+
+    def over_budget(self) -> bool:
+        return self.code_budget is not None and self.generation.code_bytes() + self.generation.ir_bytes() > self.code_budget
+
+    def remove_module(self, llvm_module : binding.ModuleRef) -> None:
+        """Remove a module from the engine and free it."""
+        self.generation.remove_module(llvm_module)
+
+    def add_fragments(self, bytecode : list[list[int]]) -> list[str]:
+        """Compile the fragments of the bytecode that are not cached yet into
+        the engine, and return the keys of all its fragments."""
+        keys = []
+        try:
+            for fragment in split_fragments(bytecode, self.fragment_size, self.capacity):
+                fragment_key = bytecode_hash(fragment)
+                entry = self.fragments.get(fragment_key)
+                if entry is None:
+                    self.fragment_misses += 1
+                    # A fragment is a program whose STOP means "continue"
+                    module = compile_bytecode(fragment + [[0x00]], name=f"fragment_{fragment_key[:16]}", byteorder=self.byteorder,
+                                              promote_stack=self.promote_stack, opt_level=self.opt_level, target_machine=self.target_machine,
+                                              runtime=self.shared_runtime, word_size=self.word_size, capacity=self.capacity)
+                    llvm_mod = to_llvm_module(module)
+                    self.generation.add_module(llvm_mod)
+                    entry = self.fragments[fragment_key] = [llvm_mod, 0]
+                else:
+                    self.fragment_hits += 1
+                entry[1] += 1
+                keys.append(fragment_key)
+        except ValueError:
+            self.release_fragments(keys)
+            raise
+        return keys
+
+    def release_fragments(self, keys : list[str]) -> None:
+        """Release fragments used by an evicted program, removing the unused ones."""
+        for fragment_key in keys:
+            entry = self.fragments[fragment_key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.remove_module(entry[0])
+                del self.fragments[fragment_key]
+
+    def run(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int]) -> tuple[int, list[int], list[int]]:
+        """Compile (or fetch from the cache) and run the bytecode."""
+        return self.compile(bytecode).run(in_array, out_array)
+
+    def run_batch(self, bytecode : list[list[int]], in_records : list[list[int]], out_records : list[list[int]]) -> tuple[list[int], list[list[int]], list[list[int]]]:
+        """Compile (or fetch from the cache) and run the bytecode over N records."""
+        return self.compile(bytecode).run_batch(in_records, out_records)
+
+    def footprints(self) -> dict:
+        """Return the bytes of object code and of IR (as bitcode) of each cached
+        program, by name. Fragments shared by programs are not included."""
+        with self.lock:
+            return {program.name: {"code_bytes": program.code_bytes, "ir_bytes": program.ir_bytes} for program in self.cache.values()}
+
+    def stats(self) -> dict:
+        """Return the cache counters, the bytes of object code and IR held by
+        the current execution engine and of code retired from it, and the
+        resident set size of the process."""
+        return {
+            "size": len(self.cache),
+            "capacity": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fragments": len(self.fragments),
+            "fragment_hits": self.fragment_hits,
+            "fragment_misses": self.fragment_misses,
+            "code_bytes": self.generation.code_bytes(),
+            "ir_bytes": self.generation.ir_bytes(),
+            "retired_bytes": self.generation.retired_bytes,
+            "recycles": self.recycles,
+            "resident_bytes": resident_bytes(),
+        }
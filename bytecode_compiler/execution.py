@@ -1,70 +1,273 @@
+import ctypes
+from array import array
+from ctypes import CFUNCTYPE, c_uint8, c_int32, c_int64, POINTER
 import llvmlite.binding as binding
 from llvmlite import ir
+from bytecode_compiler.parser import max_array_size, word_size, get_record_size
+from bytecode_compiler.compiler import copy_target_machine
+from bytecode_compiler.profiling import Profiler, timed, read_counters
+
+# Signature of the generated function: i8 function(i8* in, i8* out)
+func_type = CFUNCTYPE(c_uint8, POINTER(c_uint8), POINTER(c_uint8))
+
+# Signature of the batch function: void function_batch(i8* in, i8* out, i64 n, i8* status)
+batch_func_type = CFUNCTYPE(None, POINTER(c_uint8), POINTER(c_uint8), c_int64, POINTER(c_uint8))
+
+# Signatures of the entry points of a library: i8 library(i32 id, i8* in, i8* out)
+# and void library_batch(i32 id, i8* in, i8* out, i64 n, i8* status)
+library_func_type = CFUNCTYPE(c_uint8, c_int32, POINTER(c_uint8), POINTER(c_uint8))
+library_batch_func_type = CFUNCTYPE(None, c_int32, POINTER(c_uint8), POINTER(c_uint8), c_int64, POINTER(c_uint8))
+
+# Signature of the SIMD function: void function_simd(i8* in, i8* out, i64 nblocks)
+simd_func_type = CFUNCTYPE(None, POINTER(c_uint8), POINTER(c_uint8), c_int64)
+
+limb_mask = (1 << 64) - 1
+
+def int_list_to_bytearray(int_list : list[int], byteorder : str = 'big', word_size : int = word_size) -> bytearray:
+    """Convert a list of words to a byte array of words of 'word_size' bits in the given byte order."""
+    size = word_size // 8
+    return bytearray(b"".join(val.to_bytes(size, byteorder=byteorder, signed=False) for val in int_list))
+
+def bytearray_to_int_list(byte_array : bytes, byteorder : str = 'big', word_size : int = word_size) -> list[int]:
+    """Convert a byte array of words of 'word_size' bits in the given byte order to a list of words."""
+    size = word_size // 8
+    view = memoryview(byte_array)
+    return [int.from_bytes(view[i:i+size], byteorder=byteorder, signed=False) for i in range(0, len(view), size)]
+
+def buffer_pointer(buffer, size : int, name : str) -> ctypes.Array:
+    """Return a ctypes array aliasing the memory of a writable, contiguous
+    buffer-protocol object (bytearray, memoryview, mmap, NumPy array...) of
+    at least 'size' bytes. No data is copied."""
+    view = memoryview(buffer)
+    if view.readonly:
+        raise ValueError(f"The '{name}' buffer must be writable")
+    if not view.c_contiguous:
+        raise ValueError(f"The '{name}' buffer must be contiguous")
+    if view.nbytes < size:
+        raise ValueError(f"The '{name}' buffer holds {view.nbytes} bytes, expected at least {size}")
+    return (c_uint8 * size).from_buffer(view.cast('B'))
+
+def call_function_buffer(cfunc, in_buffer, out_buffer, word_size : int = word_size) -> int:
+    """Call a compiled function directly on 'in' and 'out' buffers of words
+    of 'word_size' bits. 'out_buffer' is updated in place."""
+    record_size = get_record_size(word_size)
+    in_ptr = buffer_pointer(in_buffer, record_size, "in")
+    out_ptr = buffer_pointer(out_buffer, record_size, "out")
+    return cfunc(in_ptr, out_ptr)
+
+def call_batch_function_buffer(batch_cfunc, in_buffer, out_buffer, n : int = None, word_size : int = word_size) -> bytearray:
+    """Call a compiled batch function directly on buffers holding n contiguous
+    'in' and 'out' records, returning the per-record result codes.
+    'n' defaults to the number of whole records in 'in_buffer'."""
+    record_size = get_record_size(word_size)
+    if n is None:
+        n = memoryview(in_buffer).nbytes // record_size
+    in_ptr = buffer_pointer(in_buffer, n * record_size, "in")
+    out_ptr = buffer_pointer(out_buffer, n * record_size, "out")
+    status = bytearray(n)
+    batch_cfunc(in_ptr, out_ptr, n, buffer_pointer(status, n, "status"))
+    return status
+
+def to_simd_layout(records : list[list[int]], lanes : int, word_size : int = word_size) -> bytearray:
+    """Lay records out in blocks of 'lanes' records for a SIMD function
+    (see compiler.genSimd): limb l of word w of the record in lane k of
+    block b is the native u64 at index ((b * max_array_size + w) * limbs + l) * lanes + k,
+    with word_size / 64 limbs per word. The last block is padded with zero records."""
+    limbs = word_size // 64
+    nblocks = -(-len(records) // lanes)
+    block_limbs = max_array_size * limbs * lanes
+    data = array('Q', bytes(8 * nblocks * block_limbs))
+    for r, record in enumerate(records):
+        if len(record) != max_array_size:
+            raise ValueError(f"Record {r} must have exactly {max_array_size} words")
+        block, lane = divmod(r, lanes)
+        index = block * block_limbs + lane
+        for value in record:
+            for _ in range(limbs):
+                data[index] = value & limb_mask
+                value >>= 64
+                index += lanes
+    return bytearray(data)
+
+def from_simd_layout(buffer, n : int, lanes : int, word_size : int = word_size) -> list[list[int]]:
+    """Read the first n records back from a buffer in the SIMD layout."""
+    limbs = word_size // 64
+    data = memoryview(buffer).cast('B').cast('Q')
+    block_limbs = max_array_size * limbs * lanes
+    records = []
+    for r in range(n):
+        block, lane = divmod(r, lanes)
+        index = block * block_limbs + lane
+        record = []
+        for _ in range(max_array_size):
+            value = 0
+            for l in range(limbs):
+                value |= data[index] << (64 * l)
+                index += lanes
+            record.append(value)
+        records.append(record)
+    return records
+
+def call_simd_function_buffer(simd_cfunc, in_buffer, out_buffer, nblocks : int, lanes : int, word_size : int = word_size) -> None:
+    """Call a compiled SIMD function directly on buffers holding 'nblocks'
+    blocks of 'lanes' records in the SIMD layout. 'out_buffer' is updated in place."""
+    size = nblocks * lanes * get_record_size(word_size)
+    simd_cfunc(buffer_pointer(in_buffer, size, "in"), buffer_pointer(out_buffer, size, "out"), nblocks)
+
+def call_simd_function(simd_cfunc, in_records : list[list[int]], out_records : list[list[int]], lanes : int,
+                       word_size : int = word_size) -> tuple[list[int], list[list[int]], list[list[int]]]:
+    """Call a compiled SIMD function over lists of 'in' and 'out' records.
+    Returns the same result as call_batch_function: programs compiled for
+    SIMD cannot fail, so every result code is 0. 'lanes' must be the number
+    of lanes the function was compiled for (see get_simd_lanes)."""
+    if len(in_records) != len(out_records):
+        raise ValueError(f"Got {len(in_records)} 'in' records but {len(out_records)} 'out' records")
+    in_buffer = to_simd_layout(in_records, lanes, word_size)
+    out_buffer = to_simd_layout(out_records, lanes, word_size)
+    call_simd_function_buffer(simd_cfunc, in_buffer, out_buffer, -(-len(in_records) // lanes), lanes, word_size)
+    return [0] * len(in_records), in_records, from_simd_layout(out_buffer, len(out_records), lanes, word_size)
+
+def call_function(cfunc, in_array : list[int], out_array : list[int], byteorder : str = 'big', profiler : Profiler = None,
+                  word_size : int = word_size) -> tuple[int, list[int], list[int]]:
+    """Call a compiled function with the given 'in' and 'out' arrays, laid
+    out in the byte order and word size the function was compiled for.
+    'profiler' times the "marshal" and "native_call" phases."""
 
-def execute(in_array : list[int], out_array : list[int], module : ir.Module) -> tuple[list[int], list[int]]:
-    """Execute the LLVM module with the given 'in' and 'out' arrays."""
-    
     # Convert 'in_array' and 'out_array' to byte arrays
-    def int_list_to_bytearray(int_list):
-        byte_array = bytearray()
-        for val in int_list:
-            # Convert 'val' to 32-byte big-endian representation
-            bytes_val = val.to_bytes(32, byteorder='big', signed=False)
-            byte_array.extend(bytes_val)
-        return byte_array
+    with timed(profiler, "marshal"):
+        in_bytes = int_list_to_bytearray(in_array, byteorder, word_size)
+        out_bytes = int_list_to_bytearray(out_array, byteorder, word_size)
+
+    # Call the function
+    with timed(profiler, "native_call"):
+        result = call_function_buffer(cfunc, in_bytes, out_bytes, word_size)
+
+    # Convert 'out_bytes' back to 'out_array'
+    with timed(profiler, "marshal"):
+        out_array = bytearray_to_int_list(out_bytes, byteorder, word_size)
+
+    return result, in_array, out_array
+
+def call_batch_function(batch_cfunc, in_records : list[list[int]], out_records : list[list[int]], byteorder : str = 'big',
+                        word_size : int = word_size) -> tuple[list[int], list[list[int]], list[list[int]]]:
+    """Call a compiled batch function over lists of 'in' and 'out' records."""
+    if len(in_records) != len(out_records):
+        raise ValueError(f"Got {len(in_records)} 'in' records but {len(out_records)} 'out' records")
+
+    # Lay the records out contiguously
+    in_bytes = bytearray()
+    out_bytes = bytearray()
+    for i, (in_array, out_array) in enumerate(zip(in_records, out_records)):
+        if len(in_array) != max_array_size or len(out_array) != max_array_size:
+            raise ValueError(f"Record {i} must have exactly {max_array_size} 'in' and 'out' words")
+        in_bytes.extend(int_list_to_bytearray(in_array, byteorder, word_size))
+        out_bytes.extend(int_list_to_bytearray(out_array, byteorder, word_size))
+
+    # Call the function
+    status = call_batch_function_buffer(batch_cfunc, in_bytes, out_bytes, len(in_records), word_size)
 
-    in_bytes = int_list_to_bytearray(in_array)
-    out_bytes = int_list_to_bytearray(out_array)
+    # Split 'out_bytes' back into records
+    out_words = bytearray_to_int_list(out_bytes, byteorder, word_size)
+    out_records = [out_words[i:i+max_array_size] for i in range(0, len(out_words), max_array_size)]
 
-    # Create ctypes buffers
-    import ctypes
+    return list(status), in_records, out_records
 
-    in_buffer = ctypes.create_string_buffer(bytes(in_bytes), len(in_bytes))
-    out_buffer = ctypes.create_string_buffer(bytes(out_bytes), len(out_bytes))
+def create_engine(module : ir.Module | binding.ModuleRef, target_machine : binding.TargetMachine = None, profiler : Profiler = None) -> binding.ExecutionEngine:
+    """Create a one-off execution engine holding the compiled LLVM module,
+    with a copy of 'target_machine' (see compiler.copy_target_machine), so
+    the caller's target machine outlives the engine.
+    'profiler' times the "ir_to_text", "parse_ir", "verify" and "jit" phases."""
 
     # Compile the module
-    llvm_ir = str(module)
-    llvm_mod = binding.parse_assembly(llvm_ir)
-    llvm_mod.verify()
+    with timed(profiler, "ir_to_text"):
+        llvm_ir = str(module)
+    with timed(profiler, "parse_ir"):
+        llvm_mod = binding.parse_assembly(llvm_ir)
+    with timed(profiler, "verify"):
+        llvm_mod.verify()
 
-    # Create a target machine
-    target = binding.Target.from_default_triple()
-    target_machine = target.create_target_machine()
+    # The execution engine frees its target machine, so give it its own
+    target_machine = copy_target_machine(target_machine)
 
     # Create an execution engine
     backing_mod = binding.parse_assembly("")
     engine = binding.create_mcjit_compiler(backing_mod, target_machine)
 
     # Add the module and compile
-    engine.add_module(llvm_mod)
-    engine.finalize_object()
-    engine.run_static_constructors()
+    with timed(profiler, "jit"):
+        engine.add_module(llvm_mod)
+        engine.finalize_object()
+        engine.run_static_constructors()
 
-    # Get the function pointer
-    func_ptr = engine.get_function_address("function")
+    return engine
 
-    # Create a ctypes function
-    from ctypes import CFUNCTYPE, c_uint8, POINTER
+def get_function(engine : binding.ExecutionEngine, name : str = "function"):
+    """Return a ctypes wrapper around the compiled function 'name'."""
+    return func_type(engine.get_function_address(name))
 
-    func_type = CFUNCTYPE(c_uint8, POINTER(c_uint8), POINTER(c_uint8))
-    cfunc = func_type(func_ptr)
+def get_batch_function(engine : binding.ExecutionEngine, name : str = "function"):
+    """Return a ctypes wrapper around the batch entry point of 'name'."""
+    func_ptr = engine.get_function_address(f"{name}_batch")
+    if not func_ptr:
+        raise ValueError("The module has no batch entry point, compile it with 'batch=True'")
+    return batch_func_type(func_ptr)
 
-    # Call the function
-    in_ptr = ctypes.cast(ctypes.byref(in_buffer), POINTER(c_uint8))
-    out_ptr = ctypes.cast(ctypes.byref(out_buffer), POINTER(c_uint8))
-    result = cfunc(in_ptr, out_ptr)
-
-    # Convert 'out_buffer' back to 'out_array'
-    out_bytes = out_buffer.raw
-
-    def bytearray_to_int_list(byte_array):
-        int_list = []
-        for i in range(0, len(byte_array), 32):
-            bytes_val = byte_array[i:i+32]
-            val = int.from_bytes(bytes_val, byteorder='big', signed=False)
-            int_list.append(val)
-        return int_list
-
-    out_array = bytearray_to_int_list(out_bytes)
-    
-    return result, in_array, out_array
+def get_simd_function(engine : binding.ExecutionEngine, name : str = "function"):
+    """Return a ctypes wrapper around the SIMD entry point of 'name'."""
+    func_ptr = engine.get_function_address(f"{name}_simd")
+    if not func_ptr:
+        raise ValueError("The module has no SIMD entry point, compile it with 'simd_lanes'")
+    return simd_func_type(func_ptr)
+
+def get_simd_lanes(engine : binding.ExecutionEngine, name : str = "function") -> int:
+    """Return the number of lanes the SIMD entry point of 'name' was compiled for."""
+    address = engine.get_global_value_address(f"{name}_simd_lanes")
+    if not address:
+        raise ValueError("The module has no SIMD entry point, compile it with 'simd_lanes'")
+    return c_int64.from_address(address).value
+
+def execute(in_array : list[int], out_array : list[int], module : ir.Module | binding.ModuleRef, byteorder : str = 'big', target_machine : binding.TargetMachine = None,
+            profiler : Profiler = None, word_size : int = word_size) -> tuple[int, list[int], list[int]]:
+    """Execute the LLVM module with the given 'in' and 'out' arrays.
+    'byteorder' and 'word_size' must match those the module was compiled with.
+    'profiler' times the phases of create_engine and call_function, and
+    collects the counters of a module compiled with 'instrument=True'."""
+    with create_engine(module, target_machine, profiler) as engine:
+        result = call_function(get_function(engine), in_array, out_array, byteorder, profiler, word_size)
+        if profiler is not None:
+            counters = read_counters(engine)
+            if counters is not None:
+                profiler.add_counters(counters)
+    return result
+
+def execute_buffer(in_buffer, out_buffer, module : ir.Module | binding.ModuleRef, target_machine : binding.TargetMachine = None,
+                   word_size : int = word_size) -> int:
+    """Execute the LLVM module directly on 'in' and 'out' buffers of words of
+    'word_size' bits, without copying them. 'out_buffer' is updated in place."""
+    with create_engine(module, target_machine) as engine:
+        return call_function_buffer(get_function(engine), in_buffer, out_buffer, word_size)
+
+def execute_batch(in_records : list[list[int]], out_records : list[list[int]], module : ir.Module | binding.ModuleRef, byteorder : str = 'big', target_machine : binding.TargetMachine = None,
+                  word_size : int = word_size) -> tuple[list[int], list[list[int]], list[list[int]]]:
+    """Execute the LLVM module (compiled with 'batch=True') over N 'in'/'out'
+    records in a single native call, returning the per-record result codes."""
+    with create_engine(module, target_machine) as engine:
+        return call_batch_function(get_batch_function(engine), in_records, out_records, byteorder, word_size)
+
+def execute_batch_buffer(in_buffer, out_buffer, module : ir.Module | binding.ModuleRef, n : int = None, target_machine : binding.TargetMachine = None,
+                         word_size : int = word_size) -> bytearray:
+    """Execute the LLVM module (compiled with 'batch=True') directly on buffers
+    of N contiguous records, returning the per-record result codes."""
+    with create_engine(module, target_machine) as engine:
+        return call_batch_function_buffer(get_batch_function(engine), in_buffer, out_buffer, n, word_size)
+
+def execute_simd(in_records : list[list[int]], out_records : list[list[int]], module : ir.Module | binding.ModuleRef, lanes : int, target_machine : binding.TargetMachine = None,
+                 word_size : int = word_size) -> tuple[list[int], list[list[int]], list[list[int]]]:
+    """Execute the LLVM module (compiled with 'simd_lanes=lanes') over N
+    'in'/'out' records, 'lanes' records at a time."""
+    with create_engine(module, target_machine) as engine:
+        simd_cfunc = get_simd_function(engine)
+        compiled_lanes = get_simd_lanes(engine)
+        if lanes != compiled_lanes:
+            raise ValueError(f"The module was compiled for {compiled_lanes} SIMD lanes, got {lanes}")
+        return call_simd_function(simd_cfunc, in_records, out_records, lanes, word_size)
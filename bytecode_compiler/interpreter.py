@@ -0,0 +1,59 @@
+from bytecode_compiler.parser import word_size, capacity, errCode
+
+def interpret(bytecode : list[list[int]], in_array : list[int], out_array : list[int],
+              word_size : int = word_size, capacity : int = capacity) -> tuple[int, list[int], list[int]]:
+    """Run the bytecode in Python, with the same semantics and result codes
+    as the compiled code. Returns (result, in_array, out_array)."""
+    # Words wrap around modulo 2^word_size
+    mask = (1 << word_size) - 1
+    out_array = list(out_array)
+    stack = []
+    for opcode, *args in bytecode:
+        if opcode == 0x00:
+            # STOP
+            return 0, in_array, out_array
+        elif opcode == 0x01:
+            # LOAD
+            if len(stack) >= capacity:
+                return errCode["full"], in_array, out_array
+            stack.append(in_array[args[0]])
+        elif opcode == 0x02:
+            # STORE
+            if not stack:
+                return errCode["empty"], in_array, out_array
+            out_array[args[0]] = stack[-1]
+        elif opcode == 0x03:
+            # POP
+            if not stack:
+                return errCode["empty"], in_array, out_array
+            stack.pop()
+        elif opcode == 0x04 or opcode == 0x05:
+            # ADD, SUB
+            if len(stack) < 2:
+                return errCode["empty"], in_array, out_array
+            value2 = stack.pop()
+            value1 = stack.pop()
+            stack.append((value1 + value2 if opcode == 0x04 else value1 - value2) & mask)
+        elif opcode == 0x06:
+            # DUP
+            if not stack:
+                return errCode["empty"], in_array, out_array
+            if len(stack) >= capacity:
+                return errCode["full"], in_array, out_array
+            stack.append(stack[-1])
+        else:
+            raise ValueError(f"Unknown opcode {opcode}")
+    return 0, in_array, out_array
+
+def interpret_batch(bytecode : list[list[int]], in_records : list[list[int]], out_records : list[list[int]],
+                    word_size : int = word_size, capacity : int = capacity) -> tuple[list[int], list[list[int]], list[list[int]]]:
+    """Run the bytecode in Python over N 'in'/'out' records, like execute_batch."""
+    if len(in_records) != len(out_records):
+        raise ValueError(f"Got {len(in_records)} 'in' records but {len(out_records)} 'out' records")
+    results = []
+    new_out_records = []
+    for in_array, out_array in zip(in_records, out_records):
+        result, _, out_array = interpret(bytecode, in_array, out_array, word_size, capacity)
+        results.append(result)
+        new_out_records.append(out_array)
+    return results, in_records, new_out_records
@@ -0,0 +1,85 @@
+import weakref
+import functools
+import llvmlite.binding as binding
+from bytecode_compiler.parser import word_size, capacity
+from bytecode_compiler.compiler import compile_library, create_target_machine, to_llvm_module
+from bytecode_compiler.engine import bytecode_hash
+from bytecode_compiler.execution import library_func_type, library_batch_func_type, call_function, call_batch_function, call_function_buffer, call_batch_function_buffer
+
+class ProgramLibrary:
+    """A fixed set of programs compiled together into one module (see
+    compile_library) and one execution engine, with a single finalisation.
+
+    Programs are run by id, their index in 'programs', through one native
+    entry point that dispatches on the id, so a large set of programs costs
+    one module and one symbol table instead of one of each per program.
+    An unknown id makes the native code return errCode["invalid"], while
+    the methods below raise IndexError first. The execution engine is
+    closed by close() or once the library is garbage collected."""
+
+    def __init__(self, programs : list[list[list[int]]], byteorder : str = "big", promote_stack : bool = False,
+                 opt_level : int = 2, cpu : str = "", features : str = "", name : str = "library",
+                 word_size : int = word_size, capacity : int = capacity):
+        self.programs = list(programs)
+        self.byteorder = byteorder
+        self.word_size = word_size
+        self.name = name
+        self.ids = {}
+        for program_id, bytecode in enumerate(self.programs):
+            self.ids.setdefault(bytecode_hash(bytecode), program_id)
+
+        # Compile all the programs into one execution engine
+        self.target_machine = create_target_machine(opt_level, cpu, features)
+        module = compile_library(self.programs, name=name, byteorder=byteorder, promote_stack=promote_stack,
+                                 opt_level=opt_level, target_machine=self.target_machine, word_size=word_size, capacity=capacity)
+        self.jit = binding.create_mcjit_compiler(binding.parse_assembly(""), self.target_machine)
+        self.jit.add_module(to_llvm_module(module))
+        self.jit.finalize_object()
+        self.jit.run_static_constructors()
+        self.cfunc = library_func_type(self.jit.get_function_address(name))
+        self.batch_cfunc = library_batch_func_type(self.jit.get_function_address(f"{name}_batch"))
+        self.finalizer = weakref.finalize(self, self.jit.close)
+
+    def close(self) -> None:
+        """Free the machine code of the library, which must not be run afterwards."""
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.programs)
+
+    def index(self, bytecode : list[list[int]]) -> int:
+        """Return the id of the (first) program with this bytecode."""
+        program_id = self.ids.get(bytecode_hash(bytecode))
+        if program_id is None:
+            raise ValueError("The bytecode is not in the library")
+        return program_id
+
+    def check_id(self, program_id : int) -> None:
+        if not 0 <= program_id < len(self.programs):
+            raise IndexError(f"Program id {program_id} out of range for a library of {len(self.programs)} programs")
+
+    def run(self, program_id : int, in_array : list[int], out_array : list[int]) -> tuple[int, list[int], list[int]]:
+        """Run program 'program_id' with the given 'in' and 'out' arrays."""
+        self.check_id(program_id)
+        return call_function(functools.partial(self.cfunc, program_id), in_array, out_array, self.byteorder, word_size=self.word_size)
+
+    def run_batch(self, program_id : int, in_records : list[list[int]], out_records : list[list[int]]) -> tuple[list[int], list[list[int]], list[list[int]]]:
+        """Run program 'program_id' over N 'in'/'out' records in a single native call."""
+        self.check_id(program_id)
+        return call_batch_function(functools.partial(self.batch_cfunc, program_id), in_records, out_records, self.byteorder, self.word_size)
+
+    def run_buffer(self, program_id : int, in_buffer, out_buffer) -> int:
+        """Run program 'program_id' directly on 'in' and 'out' buffers, updating 'out_buffer' in place."""
+        self.check_id(program_id)
+        return call_function_buffer(functools.partial(self.cfunc, program_id), in_buffer, out_buffer, self.word_size)
+
+    def run_batch_buffer(self, program_id : int, in_buffer, out_buffer, n : int = None) -> bytearray:
+        """Run program 'program_id' directly on buffers of n contiguous records."""
+        self.check_id(program_id)
+        return call_batch_function_buffer(functools.partial(self.batch_cfunc, program_id), in_buffer, out_buffer, n, self.word_size)
@@ -0,0 +1,118 @@
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from bytecode_compiler.engine import Engine, bytecode_hash
+from bytecode_compiler.execution import int_list_to_bytearray, bytearray_to_int_list
+from bytecode_compiler.parser import max_array_size, word_size, get_record_size
+
+# The warm JIT engine of a worker process
+worker_engine = None
+
+def init_worker(engine_options : dict) -> None:
+    """Create the JIT engine of a worker process."""
+    global worker_engine
+    worker_engine = Engine(**engine_options)
+
+def run_chunk(in_name : str, out_name : str, status_name : str, programs : dict, program_ids : list[int], start : int) -> None:
+    """Run the jobs [start, start + len(program_ids)) of a batch held in shared memory.
+    Consecutive jobs running the same program go through a single batch call."""
+    record_size = get_record_size(worker_engine.word_size)
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    status_shm = shared_memory.SharedMemory(name=status_name)
+    try:
+        i = 0
+        while i < len(program_ids):
+            # Find the run of jobs using the same program
+            j = i
+            while j < len(program_ids) and program_ids[j] == program_ids[i]:
+                j += 1
+            program = worker_engine.compile(programs[program_ids[i]])
+            first, last = (start + i) * record_size, (start + j) * record_size
+            in_view = in_shm.buf[first:last]
+            out_view = out_shm.buf[first:last]
+            status = program.run_batch_buffer(in_view, out_view, j - i)
+            status_shm.buf[start + i:start + j] = status
+            in_view.release()
+            out_view.release()
+            i = j
+    finally:
+        in_shm.close()
+        out_shm.close()
+        status_shm.close()
+
+class ParallelRunner:
+    """Run batches of (bytecode, 'in' array) jobs on a pool of worker processes.
+
+    'in' and 'out' words live in shared memory, so only the bytecode of the
+    programs is sent to the workers, each of which keeps a warm Engine
+    (created with 'engine_options'). Jobs are sharded in chunks of
+    'chunk_size', and results are returned in job order."""
+
+    def __init__(self, workers : int = None, chunk_size : int = 64, mp_context : str = "spawn", **engine_options):
+        if chunk_size < 1:
+            raise ValueError(f"Chunk size must be positive, got {chunk_size}")
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.byteorder = engine_options.get("byteorder", "big")
+        self.word_size = engine_options.get("word_size", word_size)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(mp_context),
+                                            initializer=init_worker, initargs=(engine_options,))
+
+    def run(self, jobs : list[tuple[list[list[int]], list[int]]]) -> list[tuple[int, list[int]]]:
+        """Run the jobs, starting each from a zeroed 'out' array, and return
+        the (result, out_array) of each job in order."""
+        n = len(jobs)
+        if n == 0:
+            return []
+        record_size = get_record_size(self.word_size)
+
+        # Number the distinct programs
+        ids = {}
+        programs = {}
+        program_ids = []
+        for bytecode, _ in jobs:
+            key = bytecode_hash(bytecode)
+            if key not in ids:
+                ids[key] = len(ids)
+                programs[ids[key]] = bytecode
+            program_ids.append(ids[key])
+
+        in_shm = shared_memory.SharedMemory(create=True, size=n * record_size)
+        out_shm = shared_memory.SharedMemory(create=True, size=n * record_size)
+        status_shm = shared_memory.SharedMemory(create=True, size=n)
+        try:
+            # Write the 'in' arrays (the 'out' arrays start zeroed)
+            for i, (_, in_array) in enumerate(jobs):
+                if len(in_array) != max_array_size:
+                    raise ValueError(f"Job {i} must have exactly {max_array_size} 'in' words")
+                in_shm.buf[i * record_size:(i + 1) * record_size] = int_list_to_bytearray(in_array, self.byteorder, self.word_size)
+            out_shm.buf[:n * record_size] = bytes(n * record_size)
+
+            # Dispatch the chunks and wait for them
+            futures = []
+            for start in range(0, n, self.chunk_size):
+                chunk_ids = program_ids[start:start + self.chunk_size]
+                chunk_programs = {id: programs[id] for id in set(chunk_ids)}
+                futures.append(self.executor.submit(run_chunk, in_shm.name, out_shm.name, status_shm.name, chunk_programs, chunk_ids, start))
+            for future in futures:
+                future.result()
+
+            # Read the results back
+            out_words = bytearray_to_int_list(out_shm.buf[:n * record_size], self.byteorder, self.word_size)
+            return [(status_shm.buf[i], out_words[i * max_array_size:(i + 1) * max_array_size]) for i in range(n)]
+        finally:
+            for shm in (in_shm, out_shm, status_shm):
+                shm.close()
+                shm.unlink()
+
+    def close(self) -> None:
+        """Shut the worker processes down."""
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -9,15 +9,29 @@ cmd2opcode = {
 }
 
 max_array_size = 256 # Number of values of the maximum index operand which is a single byte
-word_size = 256 # 32 bytes
+word_size = 256 # Default size in bits of the words, which wrap around modulo 2^word_size
+word_sizes = (64, 128, 256) # Supported word sizes
+byteorders = ("little", "big") # Supported byte orders of the words in the 'in' and 'out' arrays
+capacity = 1024 # Default maximum number of words on the stack
+max_capacity = 65536 # Largest supported capacity (the stack lives on the native stack of the call)
+errCode = { "full": 1, "empty": 2, "invalid": 3 } # Result codes of a program stopped by a stack error, or of an unknown program id in a library (0 is success)
+stack_effects = { 0x01: (0, 1), 0x02: (1, 1), 0x03: (1, 0), 0x04: (2, 1), 0x05: (2, 1), 0x06: (1, 2) } # Words read and left on the stack by each opcode but STOP
+
+def get_record_size(word_size : int = word_size) -> int:
+    """Return the size in bytes of one 'in' or 'out' array of words of 'word_size' bits."""
+    return max_array_size * word_size // 8
+
+def check_layout(word_size : int, capacity : int) -> None:
+    """Raise a ValueError unless the word size and the stack capacity are supported."""
+    if word_size not in word_sizes:
+        raise ValueError(f"Unsupported word size {word_size}, expected one of {word_sizes}")
+    if not 1 <= capacity <= max_capacity:
+        raise ValueError(f"Stack capacity must be between 1 and {max_capacity}, got {capacity}")
 
 # Parse the assembly commands into bytecode
 def parse_assembly(assembly):
-    # Check there is only a signle STOP command
-    if assembly.count("STOP") != 1:
-        raise ValueError("There must be exactly one STOP command")
-    
     bytecode = []
+    stops = 0
     for line_num, line in enumerate(assembly.splitlines(), 1):
         line = line.strip()
         if not line or line.startswith('#'):
@@ -27,6 +41,8 @@ def parse_assembly(assembly):
         if cmd not in cmd2opcode:
             raise ValueError(f"Unknown command '{cmd}' on line {line_num}")
         opcode, has_arg = cmd2opcode[cmd]
+        if opcode == 0x00:
+            stops += 1
         bytecode.append([opcode])
         if has_arg:
             if len(parts) != 2:
@@ -41,4 +57,8 @@ def parse_assembly(assembly):
         else:
             if len(parts) != 1:
                 raise ValueError(f"Command '{cmd}' on line {line_num} does not take an argument")
-    return bytecode
\ No newline at end of file
+
+    # Check there is only a single STOP command
+    if stops != 1:
+        raise ValueError("There must be exactly one STOP command")
+    return bytecode
@@ -0,0 +1,139 @@
+from typing import Callable
+from bytecode_compiler.parser import capacity, stack_effects
+
+# A rule rewrites error-free bytecode into bytecode with the same final 'out'
+# array. Rules may assume that no instruction fails and that the program ends
+# with its only STOP.
+Rule = Callable[[list[list[int]]], list[list[int]]]
+
+def check_stack(bytecode : list[list[int]], capacity : int = capacity) -> str | None:
+    """Simulate the stack depth (for a stack of 'capacity' words) and return
+    a description of the first stack error, or None if the program cannot fail."""
+    depth = 0
+    for i, (opcode, *_) in enumerate(bytecode):
+        if opcode == 0x00:
+            return None
+        pops, pushes = stack_effects[opcode]
+        if depth < pops:
+            return f"Stack underflow at instruction {i}"
+        depth += pushes - pops
+        if depth > capacity:
+            return f"Stack overflow at instruction {i}"
+    return None
+
+def remove_after_stop(bytecode : list[list[int]]) -> list[list[int]]:
+    """Drop the instructions after STOP, which never run."""
+    for i, (opcode, *_) in enumerate(bytecode):
+        if opcode == 0x00:
+            return bytecode[:i + 1]
+    return bytecode
+
+def remove_dead_stores(bytecode : list[list[int]]) -> list[list[int]]:
+    """Drop the STOREs to a slot that is stored to again later."""
+    stored = set()
+    result = []
+    for opcode, *args in reversed(bytecode):
+        if opcode == 0x02:
+            if args[0] in stored:
+                continue
+            stored.add(args[0])
+        result.append([opcode, *args])
+    result.reverse()
+    return result
+
+def remove_dead_values(bytecode : list[list[int]]) -> list[list[int]]:
+    """Drop the instructions computing values that never reach a STORE,
+    together with the POPs discarding them, e.g. 'LOAD i; POP', 'DUP; POP',
+    'LOAD i; LOAD j; ADD; POP' or anything after the last STORE. A dead
+    ADD or SUB of a live value becomes a POP of that value.
+
+    Each stack value is tracked from the instruction producing it to the one
+    consuming it. Removing a dead value and its consumer leaves the live
+    values in the same order, so every remaining instruction sees the same
+    operands."""
+    producers = []  # producing instruction of each value
+    sources = []  # values read to produce each value
+    consumers = {}  # value -> index of the POP discarding it
+    live = set()
+    stack = []
+    for i, (opcode, *_) in enumerate(bytecode):
+        if opcode in (0x01, 0x04, 0x05, 0x06):
+            if opcode == 0x01:
+                operands = []
+            elif opcode == 0x06:
+                operands = [stack[-1]]
+            else:
+                operands = [stack.pop(), stack.pop()]
+            stack.append(len(producers))
+            producers.append(i)
+            sources.append(operands)
+        elif opcode == 0x02:
+            live.add(stack[-1])
+        elif opcode == 0x03:
+            consumers[stack.pop()] = i
+
+    # Values are numbered in program order, so their sources come first
+    for value in range(len(producers) - 1, -1, -1):
+        if value in live:
+            live.update(sources[value])
+
+    # Replace each dead instruction by POPs of its live operands, if any (a
+    # dead ADD of a stored value), and drop the POPs of dead values
+    replacements = {i: [] for value, i in consumers.items() if value not in live}
+    for value, i in enumerate(producers):
+        if value not in live:
+            operands = sources[value] if bytecode[i][0] != 0x06 else []
+            replacements[i] = [[0x03] for operand in operands if operand in live]
+    result = []
+    for i, instruction in enumerate(bytecode):
+        result.extend(replacements.get(i, [instruction]))
+    return result
+
+def reuse_loads(bytecode : list[list[int]]) -> list[list[int]]:
+    """Rewrite 'LOAD i; LOAD i' as 'LOAD i; DUP', which reuses the loaded word."""
+    result = []
+    for opcode, *args in bytecode:
+        if opcode == 0x01 and result and result[-1] == [0x01, *args]:
+            result.append([0x06])
+        else:
+            result.append([opcode, *args])
+    return result
+
+default_rules = [remove_after_stop, remove_dead_stores, remove_dead_values, reuse_loads]
+
+def optimize_bytecode(bytecode : list[list[int]], rules : list[Rule] = None, capacity : int = capacity) -> tuple[list[list[int]], dict]:
+    """Apply the rewrite rules (default_rules if None) until none of them
+    changes the bytecode, and return the new bytecode and a report.
+
+    Status codes are preserved by leaving programs that may fail with a stack
+    error (with a stack of 'capacity' words) unchanged. The report holds the instruction counts before and
+    after, the number of instructions removed by each rule, and the reason
+    the program was skipped, if any. The instructions after STOP are always
+    dropped first, whatever the rules."""
+    if rules is None:
+        rules = default_rules
+    report = {
+        "before": len(bytecode),
+        "after": len(bytecode),
+        "removed": {rule.__name__: 0 for rule in rules},
+        "skipped": check_stack(bytecode, capacity),
+    }
+    if report["skipped"] is not None:
+        return bytecode, report
+
+    # The rules assume that the program ends with its only STOP
+    truncated = remove_after_stop(bytecode)
+    report["removed"]["remove_after_stop"] = report["removed"].get("remove_after_stop", 0) + len(bytecode) - len(truncated)
+    bytecode = truncated
+
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            rewritten = rule(bytecode)
+            if rewritten != bytecode:
+                report["removed"][rule.__name__] += len(bytecode) - len(rewritten)
+                bytecode = rewritten
+                changed = True
+    report["after"] = len(bytecode)
+    return bytecode, report
@@ -0,0 +1,66 @@
+from bytecode_compiler.interpreter import interpret
+from bytecode_compiler.parser import word_size, capacity
+
+def fit_line(points : list[tuple[float, float]]) -> tuple[float, float]:
+    """Least-squares fit of y = a + b * x, returning (a, b) with a, b >= 0."""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return mean_y, 0.0
+    b = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x)
+    return max(0.0, mean_y - b * mean_x), b
+
+class CrossoverPolicy:
+    """Choose between the interpreter and the JIT for each program.
+
+    The cost model, in seconds for a program of n instructions, is
+        interpreted run: interpreter_base + interpreter_per_instruction * n
+        JIT compile:     compile_base + compile_per_instruction * n
+        JIT run:         jit_run
+    A program is JIT-compiled when its compile time is amortised over the
+    expected number of runs (or when it is already compiled). The defaults
+    were measured on an x86-64 host with an -O2 Engine; use from_report()
+    to calibrate them with differential_test() on the target machine."""
+
+    def __init__(self, engine = None, interpreter_base : float = 1.3e-5, interpreter_per_instruction : float = 3e-7,
+                 compile_base : float = 0.02, compile_per_instruction : float = 2.9e-3, jit_run : float = 4e-4):
+        self.engine = engine
+        self.interpreter_base = interpreter_base
+        self.interpreter_per_instruction = interpreter_per_instruction
+        self.compile_base = compile_base
+        self.compile_per_instruction = compile_per_instruction
+        self.jit_run = jit_run
+
+    @classmethod
+    def from_report(cls, report : dict, engine = None) -> "CrossoverPolicy":
+        """Calibrate the cost model from the latencies of a differential_test report."""
+        latency = report["latency"]
+        interpreter_base, interpreter_per_instruction = fit_line([(entry["length"], entry["interpreter_run"]) for entry in latency])
+        compile_base, compile_per_instruction = fit_line([(entry["length"], entry["jit_compile"]) for entry in latency])
+        jit_run = sum(entry["jit_run"] for entry in latency) / len(latency)
+        return cls(engine, interpreter_base, interpreter_per_instruction, compile_base, compile_per_instruction, jit_run)
+
+    def is_compiled(self, bytecode : list[list[int]]) -> bool:
+        """Return whether the engine (an Engine or an ArtifactCache) already holds the compiled program."""
+        return self.engine is not None and bytecode in self.engine
+
+    def backend(self, bytecode : list[list[int]], runs : int = 1) -> str:
+        """Return "jit" or "interpreter", the cheapest backend for running the bytecode 'runs' times."""
+        n = len(bytecode)
+        compile_time = 0.0 if self.is_compiled(bytecode) else self.compile_base + self.compile_per_instruction * n
+        interpreted = runs * (self.interpreter_base + self.interpreter_per_instruction * n)
+        compiled = compile_time + runs * self.jit_run
+        return "jit" if compiled < interpreted else "interpreter"
+
+    def run(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int], runs : int = 1) -> tuple[int, list[int], list[int]]:
+        """Run the bytecode on the backend chosen for 'runs' expected runs."""
+        if self.backend(bytecode, runs) == "interpreter":
+            # Interpret with the layout of the engine, so results do not change with the backend
+            return interpret(bytecode, in_array, out_array, getattr(self.engine, "word_size", word_size),
+                             getattr(self.engine, "capacity", capacity))
+        if self.engine is None:
+            from bytecode_compiler.engine import Engine
+            self.engine = Engine()
+        return self.engine.run(bytecode, in_array, out_array)
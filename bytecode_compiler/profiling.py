@@ -0,0 +1,85 @@
+import os
+import json
+import ctypes
+import contextlib
+from time import perf_counter
+from bytecode_compiler.parser import cmd2opcode, errCode
+
+# Names of the counters of instrumented code, by index
+opcode_names = [cmd for cmd, _ in sorted(cmd2opcode.items(), key=lambda item: item[1][0])]
+result_codes = [0] + sorted(errCode.values())
+
+def counter_names(name : str = "function") -> tuple[str, str]:
+    """Return the names of the global opcode and result counters of the instrumented function 'name'."""
+    return f"{name}_opcode_counts", f"{name}_result_counts"
+
+class Profiler:
+    """Accumulate the wall-clock time spent in each phase of the pipeline,
+    and the counters read from instrumented code."""
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {"opcodes": dict.fromkeys(opcode_names, 0), "results": dict.fromkeys(result_codes, 0)}
+
+    def add(self, name : str, seconds : float) -> None:
+        """Record one call of the phase 'name' that took 'seconds'."""
+        phase = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0})
+        phase["calls"] += 1
+        phase["seconds"] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, name : str):
+        """Time the body of the 'with' statement as one call of the phase 'name'."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    def add_counters(self, counters : dict) -> None:
+        """Add counters returned by read_counters."""
+        for group, values in counters.items():
+            for key, value in values.items():
+                self.counters[group][key] += value
+
+    def stats(self) -> dict:
+        """Return the phase timings and the counters."""
+        return {"phases": self.phases, "counters": self.counters}
+
+    def to_json(self, indent : int = 2) -> str:
+        """Return the stats as JSON."""
+        return json.dumps(self.stats(), indent=indent)
+
+def timed(profiler : Profiler | None, name : str):
+    """Time a phase with 'profiler', or do nothing if it is None."""
+    return profiler.phase(name) if profiler is not None else contextlib.nullcontext()
+
+def read_counters_at(opcode_address : int, result_address : int, reset : bool = False) -> dict:
+    """Read (and optionally reset) the counters of instrumented code at the given addresses.
+    Counters are not atomic, so they may miss counts when the code runs in several threads."""
+    opcodes = (ctypes.c_uint64 * len(opcode_names)).from_address(opcode_address)
+    results = (ctypes.c_uint64 * len(result_codes)).from_address(result_address)
+    counters = {
+        "opcodes": dict(zip(opcode_names, opcodes)),
+        "results": dict(zip(result_codes, results)),
+    }
+    if reset:
+        ctypes.memset(opcode_address, 0, ctypes.sizeof(opcodes))
+        ctypes.memset(result_address, 0, ctypes.sizeof(results))
+    return counters
+
+def read_counters(jit, name : str = "function", reset : bool = False) -> dict | None:
+    """Read the counters of the instrumented function 'name' from an execution
+    engine, or return None if it was not compiled with 'instrument=True'."""
+    addresses = [jit.get_global_value_address(counter) for counter in counter_names(name)]
+    if not all(addresses):
+        return None
+    return read_counters_at(*addresses, reset=reset)
+
+def resident_bytes() -> int:
+    """Return the resident set size of the process in bytes (from /proc/self/statm), or 0 if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
@@ -0,0 +1,102 @@
+import mmap
+from typing import Iterator, TextIO, BinaryIO
+from bytecode_compiler.parser import max_array_size, word_size, get_record_size
+
+# Text format: one integer per line ('#' comments and blank lines are
+# skipped), records separated by a line holding only the separator.
+# Binary format: records of max_array_size raw words (32 bytes each for the
+# default word size), back to back.
+record_separator = "---"
+
+def parse_word(text : str, line_num : int, filename : str, word_size : int = word_size) -> int:
+    """Parse and validate one word of 'word_size' bits of a text array file."""
+    try:
+        value = int(text)
+    except ValueError:
+        raise ValueError(f"Invalid integer '{text}' on line {line_num} in '{filename}'")
+    if value < 0 or value >= 2**word_size:
+        raise ValueError(f"Integer {value} on line {line_num} in '{filename}' must be between 0 and 2^{word_size} - 1")
+    return value
+
+def iter_text_records(f : TextIO, filename : str = "<stream>", word_size : int = word_size) -> Iterator[list[int]]:
+    """Yield the records of a text file one at a time, each padded with zeros
+    to max_array_size words. Only one record is held in memory."""
+    record = []
+    started = False
+    for line_num, line in enumerate(f, 1):
+        line = line.strip()
+        if line == record_separator:
+            yield record + [0] * (max_array_size - len(record))
+            record = []
+            started = False
+            continue
+        if not line or line.startswith('#'):
+            continue  # Skip comments and empty lines
+        if len(record) >= max_array_size:
+            raise ValueError(f"Record ending on line {line_num} in '{filename}' exceeds {max_array_size} elements")
+        record.append(parse_word(line, line_num, filename, word_size))
+        started = True
+    if started:
+        yield record + [0] * (max_array_size - len(record))
+
+def write_text_record(f : TextIO, words : list[int], result : int = None) -> None:
+    """Write one record in the text format, preceded by its result code as a comment."""
+    if result is not None:
+        f.write(f"# result: {result}\n")
+    f.write("\n".join(map(str, words)))
+    f.write(f"\n{record_separator}\n")
+
+class BinaryRecordReader:
+    """Read binary records in chunks of up to 'chunk_records' records into a
+    preallocated buffer with readinto, so memory stays constant."""
+
+    def __init__(self, f : BinaryIO, chunk_records : int = 1024, filename : str = "<stream>", word_size : int = word_size):
+        if chunk_records < 1:
+            raise ValueError(f"Chunk size must be positive, got {chunk_records}")
+        self.f = f
+        self.filename = filename
+        self.record_size = get_record_size(word_size)
+        self.buffer = bytearray(chunk_records * self.record_size)
+        self.view = memoryview(self.buffer)
+
+    def read_chunk(self) -> int:
+        """Fill the buffer with the next records and return how many were read (0 at the end)."""
+        filled = 0
+        while filled < len(self.buffer):
+            count = self.f.readinto(self.view[filled:])
+            if not count:
+                break
+            filled += count
+        if filled % self.record_size:
+            raise ValueError(f"'{self.filename}' ends with a partial record")
+        return filled // self.record_size
+
+    def __iter__(self) -> Iterator[memoryview]:
+        """Yield views of the chunks read. Each view is only valid until the next one."""
+        while True:
+            n = self.read_chunk()
+            if n == 0:
+                return
+            yield self.view[:n * self.record_size]
+
+def map_records(filename : str, word_size : int = word_size) -> memoryview:
+    """Memory-map a binary record file copy-on-write (writes are not saved),
+    so it can be passed as an 'in' buffer without reading it."""
+    with open(filename, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if len(mapped) % get_record_size(word_size):
+        mapped.close()
+        raise ValueError(f"'{filename}' ends with a partial record")
+    return memoryview(mapped)
+
+def words_into(buffer : bytearray, offset : int, words : list[int], byteorder : str = "big", word_size : int = word_size) -> None:
+    """Write words of 'word_size' bits into 'buffer' at 'offset'."""
+    size = word_size // 8
+    for i, val in enumerate(words):
+        buffer[offset + size * i:offset + size * (i + 1)] = val.to_bytes(size, byteorder=byteorder)
+
+def words_from(buffer, offset : int, count : int = max_array_size, byteorder : str = "big", word_size : int = word_size) -> list[int]:
+    """Read 'count' words of 'word_size' bits from 'buffer' at 'offset'."""
+    size = word_size // 8
+    view = memoryview(buffer)
+    return [int.from_bytes(view[offset + size * i:offset + size * (i + 1)], byteorder=byteorder) for i in range(count)]
@@ -0,0 +1,215 @@
+import sys
+import json
+import asyncio
+import argparse
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from bytecode_compiler.parser import parse_assembly, max_array_size, word_size, word_sizes, capacity
+from bytecode_compiler.engine import Engine, bytecode_hash
+
+class PendingBatch:
+    """Requests for one program waiting to be run together."""
+
+    def __init__(self, bytecode : list[list[int]]):
+        self.bytecode = bytecode
+        self.in_records = []
+        self.out_records = []
+        self.futures = []
+        self.timer = None
+
+class AsyncRuntime:
+    """Run programs from asyncio code, coalescing concurrent requests for the
+    same program into micro-batches.
+
+    A request waits at most 'max_wait' seconds for other requests of the
+    same program, and a batch is sent as soon as it holds 'max_batch_size'
+    requests. Batches are compiled and run through the batch entry point on
+    'executor' (a thread pool by default), so the event loop never blocks on
+    LLVM or native code, and results are fanned back out to the awaiting
+    coroutines."""
+
+    def __init__(self, engine : Engine = None, max_batch_size : int = 64, max_wait : float = 0.001,
+                 executor : Executor = None, **engine_options):
+        if max_batch_size < 1:
+            raise ValueError(f"Maximum batch size must be positive, got {max_batch_size}")
+        if max_wait < 0:
+            raise ValueError(f"Maximum wait must not be negative, got {max_wait}")
+        self.engine = engine if engine is not None else Engine(**engine_options)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor()
+        self.pending = {}
+        self.tasks = set()
+        self.requests = 0
+        self.batches = 0
+
+    async def run(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int] = None) -> tuple[int, list[int]]:
+        """Run the bytecode and return (result, out_array). 'out_array' defaults to zeros."""
+        if len(in_array) != max_array_size or (out_array is not None and len(out_array) != max_array_size):
+            raise ValueError(f"The 'in' and 'out' arrays must have exactly {max_array_size} words")
+        # Reject bad words here, as they would fail the whole batch
+        limit = 1 << self.engine.word_size
+        for array_name, array in (("in", in_array), ("out", out_array or [])):
+            if not all(isinstance(word, int) and 0 <= word < limit for word in array):
+                raise ValueError(f"The words of the '{array_name}' array must be integers in [0, 2^{self.engine.word_size})")
+        loop = asyncio.get_running_loop()
+        key = bytecode_hash(bytecode)
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = PendingBatch(bytecode)
+            batch.timer = loop.call_later(self.max_wait, self.flush, key)
+        future = loop.create_future()
+        batch.in_records.append(in_array)
+        batch.out_records.append(out_array if out_array is not None else [0] * max_array_size)
+        batch.futures.append(future)
+        self.requests += 1
+        if len(batch.futures) >= self.max_batch_size:
+            self.flush(key)
+        return await future
+
+    def flush(self, key : str) -> None:
+        """Send the pending batch of a program to the executor."""
+        batch = self.pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.batches += 1
+        task = asyncio.ensure_future(self.dispatch(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def execute(self, batch : PendingBatch) -> list[tuple[int, list[int]]]:
+        """Compile and run a batch (on the executor)."""
+        program = self.engine.compile(batch.bytecode)
+        results, _, out_records = program.run_batch(batch.in_records, batch.out_records)
+        return list(zip(results, out_records))
+
+    async def dispatch(self, batch : PendingBatch) -> None:
+        """Run a batch and resolve the futures of its requests."""
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.execute, batch)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Return the number of requests and batches."""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Run the pending batches, then shut the executor down if it is the runtime's own."""
+        for key in list(self.pending):
+            self.flush(key)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.own_executor:
+            self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+@functools.lru_cache(maxsize=1024)
+def parse_program(assembly : str) -> tuple[tuple[int, ...], ...]:
+    """Parse (and cache) the assembly of a request."""
+    return tuple(tuple(instruction) for instruction in parse_assembly(assembly))
+
+async def handle_request(runtime : AsyncRuntime, line : bytes) -> dict:
+    """Answer one request: a JSON object with the assembly 'program', the 'in'
+    array and optionally the 'out' array and an 'id' that is echoed back.
+    A request may also give the 'word_size' and 'capacity' it expects, which
+    must match those of the runtime's engine."""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get("id")
+        for option in ("word_size", "capacity"):
+            expected = getattr(runtime.engine, option)
+            if request.get(option, expected) != expected:
+                raise ValueError(f"The service runs with {option} {expected}, the request needs {request[option]}")
+        bytecode = [list(instruction) for instruction in parse_program(request["program"])]
+        result, out_array = await runtime.run(bytecode, request["in"], request.get("out"))
+        response = {"result": result, "out": out_array}
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError) as e:
+        response = {"error": str(e)}
+    if request_id is not None:
+        response["id"] = request_id
+    return response
+
+async def serve(runtime : AsyncRuntime, host : str = "127.0.0.1", port : int = 0, path : str = None) -> asyncio.AbstractServer:
+    """Start a server answering line-delimited JSON requests (see handle_request)
+    on a TCP port or, with 'path', a Unix socket. Requests of one connection
+    run concurrently, so their responses may come out of order: match them by 'id'."""
+
+    async def handle_connection(reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line : bytes):
+            response = await handle_request(runtime, line)
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.ensure_future(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle_connection, path, limit=2**24)
+    return await asyncio.start_server(handle_connection, host, port, limit=2**24)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve bytecode programs over a socket, with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on (default: 8765)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="maximum requests per batch (default: 64)")
+    parser.add_argument("--max-wait", type=float, default=0.001, help="maximum time in seconds a request waits for a batch (default: 0.001)")
+    parser.add_argument("--workers", type=int, help="threads running batches (default: one per CPU)")
+    parser.add_argument("--opt", type=int, choices=range(4), default=2, help="LLVM optimisation level (default: 2)")
+    parser.add_argument("--word-size", type=int, choices=word_sizes, default=word_size, help=f"size in bits of the words (default: {word_size})")
+    parser.add_argument("--capacity", type=int, default=capacity, help=f"maximum number of words on the stack (default: {capacity})")
+    return parser.parse_args(argv)
+
+async def main_async(args) -> None:
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    async with AsyncRuntime(max_batch_size=args.max_batch_size, max_wait=args.max_wait, executor=executor, opt_level=args.opt,
+                            word_size=args.word_size, capacity=args.capacity) as runtime:
+        server = await serve(runtime, args.host, args.port, args.unix)
+        address = args.unix or "{}:{}".format(*server.sockets[0].getsockname()[:2])
+        print(f"Listening on {address}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+    executor.shutdown()
+
+def main(argv=None):
+    try:
+        asyncio.run(main_async(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
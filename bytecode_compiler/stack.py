@@ -1,15 +1,28 @@
 from llvmlite import ir
-from bytecode_compiler.utils import i256, i32, StackType, capacity, genFun
-    
-def genPeek(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.GlobalVariable) -> ir.Function:
-    
+from bytecode_compiler.utils import i8, i32, i8ptr, StackType, genFun
+from bytecode_compiler.parser import errCode
+
+# The stack helpers report errors by storing a result code into their
+# 'status' argument, which points to a slot of the running program, so
+# programs are reentrant. The word type and the capacity of the stack are
+# those of the Stack structure 'type' (see utils.stack_type).
+
+def setLinkage(func : ir.Function, linkage : str) -> None:
+    # Internal helpers are inlined into the program from -O1
+    func.linkage = linkage
+    func.attributes.add("alwaysinline")
+
+def genPeek(module : ir.Module, type : ir.IdentifiedStructType, linkage : str = "internal") -> ir.Function:
+
     # Define the 'peek' function
-    peek_func = genFun(module, "stack_peek", i256, [type.as_pointer()])
+    word = type.elements[0].element
+    peek_func = genFun(module, "stack_peek", word, [type.as_pointer(), i8ptr])
+    setLinkage(peek_func, linkage)
     block = peek_func.append_basic_block(name="entry")
     builder = ir.IRBuilder(block)
 
     # Function arguments
-    stack_ptr = peek_func.args[0]
+    stack_ptr, status = peek_func.args
 
     # Access the 'top' field of the stack
     top_ptr = builder.gep(stack_ptr, [i32(0), i32(1)], name="top_ptr")
@@ -18,35 +31,37 @@ def genPeek(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.
     # Check if the stack is empty
     is_empty = builder.icmp_signed("==", top, i32(0), name="is_empty")
     with builder.if_then(is_empty):
-        builder.store(ir.Constant(ir.IntType(1), 1), error_flag)
-        builder.ret(i256(0))
+        builder.store(i8(errCode["empty"]), status)
+        builder.ret(word(0))
 
     # Peek the value from the stack
     new_top = builder.sub(top, i32(1), name="new_top")
     data_ptr = builder.gep(stack_ptr, [i32(0), i32(0), new_top], name="data_ptr")
     value = builder.load(data_ptr, name="value")
     builder.ret(value)
-    
+
     return peek_func
-    
-def genPush(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.GlobalVariable) -> ir.Function:
+
+def genPush(module : ir.Module, type : ir.IdentifiedStructType, linkage : str = "internal") -> ir.Function:
 
     # Define the 'push' function
-    push_func = genFun(module, "stack_push", ir.VoidType(), [type.as_pointer(), i256])
+    word = type.elements[0].element
+    push_func = genFun(module, "stack_push", ir.VoidType(), [type.as_pointer(), word, i8ptr])
+    setLinkage(push_func, linkage)
     block = push_func.append_basic_block(name="entry")
     builder = ir.IRBuilder(block)
 
     # Function arguments
-    stack_ptr, value = push_func.args
+    stack_ptr, value, status = push_func.args
 
     # Access the 'top' field of the stack
     top_ptr = builder.gep(stack_ptr, [i32(0), i32(1)], name="top_ptr")
     top = builder.load(top_ptr, name="top")
 
     # Check if the stack is full
-    is_full = builder.icmp_signed(">=", top, i32(capacity), name="is_full")
+    is_full = builder.icmp_signed(">=", top, i32(type.elements[0].count), name="is_full")
     with builder.if_then(is_full):
-        builder.store(ir.Constant(ir.IntType(1), 1), error_flag)
+        builder.store(i8(errCode["full"]), status)
         builder.ret_void()
 
     # Push the value onto the stack
@@ -55,18 +70,20 @@ def genPush(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.
     new_top = builder.add(top, i32(1), name="new_top")
     builder.store(new_top, top_ptr)
     builder.ret_void()
-    
+
     return push_func
-    
-def genPop(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.GlobalVariable) -> ir.Function:
-    
+
+def genPop(module : ir.Module, type : ir.IdentifiedStructType, linkage : str = "internal") -> ir.Function:
+
     # Define the 'pop' function
-    pop_func = genFun(module, "stack_pop", i256, [type.as_pointer()])
+    word = type.elements[0].element
+    pop_func = genFun(module, "stack_pop", word, [type.as_pointer(), i8ptr])
+    setLinkage(pop_func, linkage)
     block = pop_func.append_basic_block(name="entry")
     builder = ir.IRBuilder(block)
 
     # Function arguments
-    stack_ptr = pop_func.args[0]
+    stack_ptr, status = pop_func.args
 
     # Access the 'top' field of the stack
     top_ptr = builder.gep(stack_ptr, [i32(0), i32(1)], name="top_ptr")
@@ -75,8 +92,8 @@ def genPop(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.G
     # Check if the stack is empty
     is_empty = builder.icmp_signed("==", top, i32(0), name="is_empty")
     with builder.if_then(is_empty):
-        builder.store(ir.Constant(ir.IntType(1), 1), error_flag)
-        builder.ret(i256(0))
+        builder.store(i8(errCode["empty"]), status)
+        builder.ret(word(0))
 
     # Pop the value from the stack
     new_top = builder.sub(top, i32(1), name="new_top")
@@ -84,22 +101,47 @@ def genPop(module : ir.Module, type : ir.IdentifiedStructType, error_flag : ir.G
     data_ptr = builder.gep(stack_ptr, [i32(0), i32(0), new_top], name="data_ptr")
     value = builder.load(data_ptr, name="value")
     builder.ret(value)
-    
+
     return pop_func
-    
-def genStack(module : ir.Module, builder : ir.IRBuilder, error_flag : ir.GlobalVariable) -> list[ir.AllocaInstr, ir.Function, ir.Function, ir.Function]:
-    
+
+def genRuntime(type : ir.IdentifiedStructType = StackType) -> ir.Module:
+    """Generate the runtime module, which exports the stack helpers for the
+    programs compiled with 'runtime=True' (and the same Stack structure)."""
+    module = ir.Module(name="bytecode_compiler_runtime")
+    genPeek(module, type, linkage="external")
+    genPush(module, type, linkage="external")
+    genPop(module, type, linkage="external")
+    return module
+
+def declareStack(module : ir.Module, type : ir.IdentifiedStructType) -> list[ir.Function]:
+    """Declare the stack helpers of the runtime module."""
+    word = type.elements[0].element
+    return [
+        genFun(module, "stack_peek", word, [type.as_pointer(), i8ptr]),
+        genFun(module, "stack_push", ir.VoidType(), [type.as_pointer(), word, i8ptr]),
+        genFun(module, "stack_pop", word, [type.as_pointer(), i8ptr]),
+    ]
+
+def genStack(module : ir.Module, builder : ir.IRBuilder, runtime : bool = False,
+             type : ir.IdentifiedStructType = StackType) -> list[ir.AllocaInstr, ir.Function, ir.Function, ir.Function]:
+
     # Allocate the stack
-    stack = builder.alloca(StackType, name="stack")
-    
+    stack = builder.alloca(type, name="stack")
+
     # initialize 'top' to 0
     top_ptr = builder.gep(stack, [i32(0), i32(1)], name="top_ptr")
     builder.store(i32(0), top_ptr)
-    
-    # Generate the 'peek', 'push', and 'pop' functions
-    peek_func = genPeek(module, StackType, error_flag)
-    push_func = genPush(module, StackType, error_flag)
-    pop_func = genPop(module, StackType, error_flag)
-    
+
+    # Generate the 'peek', 'push', and 'pop' functions (or reuse those of
+    # another program of the module, or link them from the runtime module)
+    if "stack_peek" in module.globals:
+        peek_func, push_func, pop_func = (module.globals[name] for name in ("stack_peek", "stack_push", "stack_pop"))
+    elif runtime:
+        peek_func, push_func, pop_func = declareStack(module, type)
+    else:
+        peek_func = genPeek(module, type)
+        push_func = genPush(module, type)
+        pop_func = genPop(module, type)
+
     # Return the stack and functions
-    return [stack, peek_func, push_func, pop_func]
\ No newline at end of file
+    return [stack, peek_func, push_func, pop_func]
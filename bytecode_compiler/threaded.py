@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from bytecode_compiler.engine import Engine
+from bytecode_compiler.parser import max_array_size, get_record_size
+
+class ThreadedRunner:
+    """Run programs concurrently on a pool of threads sharing one Engine.
+
+    Compiled code is called through ctypes, which releases the GIL for the
+    duration of the native call, so requests from several threads overlap.
+    Each thread marshals words through its own preallocated 'in'/'out'
+    buffers."""
+
+    def __init__(self, engine : Engine = None, workers : int = None, **engine_options):
+        self.engine = engine if engine is not None else Engine(**engine_options)
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+        self.buffers = threading.local()
+
+    def run(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int] = None) -> tuple[int, list[int]]:
+        """Run the bytecode on the calling thread and return (result, out_array).
+        'out_array' defaults to zeros."""
+        if len(in_array) != max_array_size or (out_array is not None and len(out_array) != max_array_size):
+            raise ValueError(f"The 'in' and 'out' arrays must have exactly {max_array_size} words")
+        program = self.engine.compile(bytecode)
+        byteorder = program.byteorder
+        size = program.word_size // 8
+        record_size = get_record_size(program.word_size)
+
+        # Fill this thread's buffers
+        if getattr(self.buffers, "record_size", None) != record_size:
+            self.buffers.record_size = record_size
+            self.buffers.in_buffer = bytearray(record_size)
+            self.buffers.out_buffer = bytearray(record_size)
+        in_buffer = self.buffers.in_buffer
+        out_buffer = self.buffers.out_buffer
+        for i, val in enumerate(in_array):
+            in_buffer[i * size:(i + 1) * size] = val.to_bytes(size, byteorder=byteorder)
+        if out_array is None:
+            out_buffer[:] = bytes(record_size)
+        else:
+            for i, val in enumerate(out_array):
+                out_buffer[i * size:(i + 1) * size] = val.to_bytes(size, byteorder=byteorder)
+
+        result = program.run_buffer(in_buffer, out_buffer)
+        out_array = [int.from_bytes(out_buffer[i:i + size], byteorder=byteorder) for i in range(0, record_size, size)]
+        return result, out_array
+
+    def submit(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int] = None) -> Future:
+        """Run the bytecode on the thread pool, returning a future of (result, out_array)."""
+        return self.executor.submit(self.run, bytecode, in_array, out_array)
+
+    def map(self, jobs : list[tuple[list[list[int]], list[int]]]) -> list[tuple[int, list[int]]]:
+        """Run (bytecode, in_array) jobs on the thread pool and return their results in order."""
+        futures = [self.submit(bytecode, in_array) for bytecode, in_array in jobs]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Shut the thread pool down."""
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
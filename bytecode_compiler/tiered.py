@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from bytecode_compiler.engine import Engine, bytecode_hash
+from bytecode_compiler.interpreter import interpret
+from bytecode_compiler.parser import word_size, capacity
+
+class TieredRuntime:
+    """Run programs in the interpreter until they get hot, then natively.
+
+    Invocations are counted per bytecode hash. When a program reaches
+    'threshold' invocations it is compiled by 'engine' (an Engine, or any
+    object whose compile(bytecode) returns a CompiledProgram, such as an
+    ArtifactCache) on a background thread, while its runs keep going to the
+    interpreter. Once compiled, the native program is swapped in and serves
+    all subsequent runs. LLVM runs without the GIL, so compilation does not
+    stall the interpreter."""
+
+    def __init__(self, engine = None, threshold : int = 100, compile_workers : int = 1, **engine_options):
+        if threshold < 1:
+            raise ValueError(f"Threshold must be positive, got {threshold}")
+        self.engine = engine if engine is not None else Engine(**engine_options)
+        # Interpret with the layout of the native code, so results do not change with the tier
+        self.word_size = getattr(self.engine, "word_size", word_size)
+        self.capacity = getattr(self.engine, "capacity", capacity)
+        self.threshold = threshold
+        self.executor = ThreadPoolExecutor(max_workers=compile_workers)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.native = {}
+        self.pending = {}
+        self.interpreted_runs = 0
+        self.native_runs = 0
+        self.promotions = 0
+        self.failed_promotions = 0
+
+    def promote(self, key : str, bytecode : list[list[int]]) -> None:
+        """Compile the program and swap it in."""
+        try:
+            program = self.engine.compile(bytecode)
+        except ValueError:
+            # e.g. a stack error caught at compile time: keep interpreting
+            with self.lock:
+                self.failed_promotions += 1
+            return
+        with self.lock:
+            self.native[key] = program
+            del self.pending[key]
+            self.promotions += 1
+
+    def run(self, bytecode : list[list[int]], in_array : list[int], out_array : list[int]) -> tuple[int, list[int], list[int]]:
+        """Run the bytecode on its current tier."""
+        key = bytecode_hash(bytecode)
+        program = self.native.get(key)
+        if program is not None:
+            with self.lock:
+                self.native_runs += 1
+            return program.run(in_array, out_array)
+
+        with self.lock:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+            if count >= self.threshold and key not in self.pending:
+                self.pending[key] = self.executor.submit(self.promote, key, bytecode)
+            self.interpreted_runs += 1
+        return interpret(bytecode, in_array, out_array, self.word_size, self.capacity)
+
+    def tier(self, bytecode : list[list[int]]) -> str:
+        """Return the tier of the bytecode: "interpreter", "compiling" or "native"."""
+        key = bytecode_hash(bytecode)
+        if key in self.native:
+            return "native"
+        future = self.pending.get(key)
+        if future is not None and not future.done():
+            return "compiling"
+        return "interpreter"
+
+    def wait(self) -> None:
+        """Wait for the pending compilations."""
+        with self.lock:
+            futures = list(self.pending.values())
+        wait(futures)
+
+    def stats(self) -> dict:
+        """Return the tier transition counters."""
+        with self.lock:
+            return {
+                "programs": len(self.counts),
+                "native_programs": len(self.native),
+                "compiling": sum(1 for future in self.pending.values() if not future.done()),
+                "interpreted_runs": self.interpreted_runs,
+                "native_runs": self.native_runs,
+                "promotions": self.promotions,
+                "failed_promotions": self.failed_promotions,
+            }
+
+    def close(self) -> None:
+        """Shut the background compiler down."""
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,19 +1,29 @@
+import threading
 from llvmlite import ir
+from bytecode_compiler.parser import word_size, capacity
 
 # Define basic types
 i8 = ir.IntType(8)
 i32 = ir.IntType(32)
+i64 = ir.IntType(64)
 i256 = ir.IntType(256)
 i8ptr = ir.PointerType(i8)
 i256ptr = ir.PointerType(i256)
 
-# Define stack capacity
-capacity = 1024
+_stack_types_lock = threading.Lock()
 
-# Define the Stack structure: struct Stack { i256 data[capacity]; i32 top; }
-array_type = ir.ArrayType(i256, capacity)
-StackType = ir.global_context.get_identified_type("Stack")
-StackType.set_body(array_type, i32)
+def stack_type(word_size : int = word_size, capacity : int = capacity) -> ir.IdentifiedStructType:
+    """Return the Stack structure for words of 'word_size' bits:
+    struct Stack { iN data[capacity]; i32 top; }"""
+    with _stack_types_lock:
+        type = ir.global_context.get_identified_type(f"Stack.i{word_size}.{capacity}")
+        if type.is_opaque:
+            type.set_body(ir.ArrayType(ir.IntType(word_size), capacity), i32)
+    return type
+
+# The Stack structure of the default word size and capacity
+StackType = stack_type()
+array_type = StackType.elements[0]
 
 def genFun(module : ir.Module, name : str, returnType : ir.Type, argTypes : list[ir.Type], var_arg : bool = False) -> ir.Function:
     """Declare an LLVM function."""
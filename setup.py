@@ -3,10 +3,11 @@ from setuptools import setup, find_packages
 setup(
     name='bytecode-compiler',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     entry_points={
         'console_scripts': [
             'bytecode-compiler=bytecode_compiler.cli:main',
+            'bytecode-compiler-daemon=bytecode_compiler.service:main',
         ],
     },
 )
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.aot import ArtifactCache
+from bytecode_compiler.policy import CrossoverPolicy
+
+ADD = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+@unittest.skipUnless(shutil.which("cc"), "no system linker")
+class TestArtifactCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build_and_load(self):
+        cache = ArtifactCache(self.directory)
+        in_array = [2**200, 2**100] + [0] * 254
+        result, _, out_array = cache.run(ADD, in_array, [0] * 256)
+        self.assertEqual(result, 0)
+        self.assertEqual(out_array[2], 2**200 + 2**100)
+        self.assertTrue(os.path.exists(cache.path(ADD)))
+        self.assertEqual(cache.builds, 1)
+
+        # A new cache (e.g. in another process) loads the artifact without compiling
+        cache = ArtifactCache(self.directory)
+        results, _, out_records = cache.load(ADD).run_batch([in_array] * 2, [[0] * 256] * 2)
+        self.assertEqual(results, [0, 0])
+        self.assertEqual(out_records[1][2], 2**200 + 2**100)
+        self.assertEqual(cache.builds, 0)
+        self.assertEqual(cache.loads, 1)
+
+    def test_options_are_part_of_the_key(self):
+        big = ArtifactCache(self.directory)
+        little = ArtifactCache(self.directory, byteorder="little", opt_level=0)
+        self.assertNotEqual(big.path(ADD), little.path(ADD))
+        result, _, out_array = little.run(ADD, [3, 4] + [0] * 254, [0] * 256)
+        self.assertEqual(out_array[2], 7)
+
+    def test_crossover_policy(self):
+        # The policy sees the artifacts of the cache as compiled programs
+        cache = ArtifactCache(self.directory, opt_level=0)
+        policy = CrossoverPolicy(cache, jit_run=1e-7)
+        self.assertFalse(policy.is_compiled(ADD))
+        self.assertEqual(policy.run(ADD, [3, 4] + [0] * 254, [0] * 256, runs=10**6)[2][2], 7)
+        self.assertTrue(policy.is_compiled(ADD))
+        self.assertIn(ADD, ArtifactCache(self.directory, opt_level=0))
@@ -0,0 +1,33 @@
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.peephole import check_stack
+from benchmarks.generators import generate_assembly, mixes
+from benchmarks.suite import run_suite, compare
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_generate_assembly(self):
+        for mix in mixes:
+            bytecode = parse_assembly(generate_assembly(500, max_depth=4, mix=mix, seed=1))
+            self.assertEqual(len(bytecode), 501)
+            self.assertIsNone(check_stack(bytecode))
+        self.assertEqual(generate_assembly(50, seed=2), generate_assembly(50, seed=2))
+        with self.assertRaises(ValueError):
+            generate_assembly(10, mix="unknown")
+
+    def test_suite_and_compare(self):
+        old = run_suite(sizes=[10], runs=2, records=8)
+        result = old["results"][0]
+        self.assertEqual(result["instructions"], 10)
+        for phase in ("parse_assembly", "ir_build", "jit", "marshal", "native_call"):
+            self.assertIn(phase, result["phases"])
+        self.assertGreater(result["records_per_second"], 0)
+        self.assertEqual(compare(old, old), [])
+
+        new = {"meta": old["meta"], "results": [dict(result, phases=dict(result["phases"], jit=10 * result["phases"]["jit"] + 1),
+                                                      records_per_second=result["records_per_second"] / 2)]}
+        regressions = {regression["metric"] for regression in compare(old, new)}
+        self.assertEqual(regressions, {"phases.jit", "records_per_second"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.compiler import compile_bytecode
+from bytecode_compiler.binary import encode, decode, iter_decode, decode_stream, write_bundle, Bundle
+
+PROGRAM = parse_assembly('''
+    LOAD 0
+    LOAD 255
+    ADD
+    DUP
+    STORE 2
+    POP
+    SUB
+    STOP
+''')
+
+class TestBinary(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = encode(PROGRAM)
+        self.assertEqual(data[:6], bytes([0x01, 0, 0x01, 255, 0x04, 0]))
+        self.assertEqual(len(data), 2 * len(PROGRAM))
+        self.assertEqual(decode(data), PROGRAM)
+        self.assertEqual(list(iter_decode(memoryview(bytearray(data)))), PROGRAM)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            decode(bytes([0x07, 0]))
+        with self.assertRaises(ValueError):
+            decode(bytes([0x04, 1]))
+        with self.assertRaises(ValueError):
+            decode(bytes([0x01, 0, 0x00]))
+
+        # Programs must have exactly one STOP, as in assembly
+        for data in (bytes([0x01, 0, 0x02, 1]), bytes([0x00, 0, 0x00, 0])):
+            with self.assertRaises(ValueError):
+                decode(data)
+            with self.assertRaises(ValueError):
+                list(decode_stream([data]))
+        # and STOP-less bytecode is not compiled into a function without a return
+        with self.assertRaises(ValueError):
+            compile_bytecode([[0x01, 0], [0x02, 1]])
+
+    def test_stream(self):
+        data = encode(PROGRAM)
+        chunks = [data[:3], data[3:4], b"", data[4:11], data[11:]]
+        self.assertEqual(list(decode_stream(chunks)), PROGRAM)
+        with self.assertRaises(ValueError):
+            list(decode_stream([data[:3]]))
+
+    def test_bundle(self):
+        programs = [PROGRAM, parse_assembly("STOP"), parse_assembly("LOAD 1\nSTORE 1\nSTOP")] * 100
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.assertEqual(write_bundle(filename, programs), 300)
+            with Bundle(filename) as bundle:
+                self.assertEqual(len(bundle), 300)
+                self.assertEqual(bundle[0], PROGRAM)
+                self.assertEqual(bundle[-1], programs[-1])
+                self.assertEqual(bytes(bundle.raw(1)), encode(programs[1]))
+                self.assertEqual(list(bundle), programs)
+                with self.assertRaises(IndexError):
+                    bundle[300]
+        finally:
+            os.remove(filename)
+
+    def test_stop_in_comment(self):
+        # Only STOP commands count, not the word in comments
+        bytecode = parse_assembly("# Load, then STOP\nLOAD 0\nSTOP")
+        self.assertEqual(bytecode, [[0x01, 0], [0x00]])
+        with self.assertRaises(ValueError):
+            parse_assembly("LOAD 0\nSTOP\nSTOP")
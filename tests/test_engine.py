@@ -0,0 +1,205 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.compiler import compile_bytecode, split_fragments
+from bytecode_compiler.engine import Engine, bytecode_hash
+
+ADD = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+SUB = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    SUB
+    STORE 2
+    STOP
+''')
+
+DUP = parse_assembly('''
+    LOAD 0
+    DUP
+    STORE 0
+    STORE 1
+    STOP
+''')
+
+class TestEngine(unittest.TestCase):
+
+    def test_cache_hit(self):
+        engine = Engine()
+        in_array = [10, 20] + [0] * 254
+        out_array = [0] * 256
+        first = engine.compile(ADD)
+        second = engine.compile(parse_assembly("LOAD 0\nLOAD 1\nADD\nSTORE 2\nSTOP"))
+        self.assertIs(first, second)
+        result, _, actual_out_array = engine.run(ADD, in_array, out_array)
+        self.assertEqual(result, 0)
+        self.assertEqual(actual_out_array, [0, 0, 30] + [0] * 253)
+        self.assertEqual(engine.stats()["misses"], 1)
+        self.assertEqual(engine.stats()["hits"], 2)
+
+    def test_programs_share_engine(self):
+        engine = Engine()
+        in_array = [50, 20] + [0] * 254
+        out_array = [0] * 256
+        _, _, added = engine.run(ADD, in_array, out_array)
+        _, _, subtracted = engine.run(SUB, in_array, out_array)
+        self.assertEqual(added[2], 70)
+        self.assertEqual(subtracted[2], 30)
+
+    def test_lru_eviction(self):
+        engine = Engine(cache_size=2)
+        engine.compile(ADD)
+        engine.compile(SUB)
+        engine.compile(ADD)  # ADD is now the most recently used
+        engine.compile(DUP)  # evicts SUB
+        self.assertIn(bytecode_hash(ADD), engine.cache)
+        self.assertNotIn(bytecode_hash(SUB), engine.cache)
+        self.assertEqual(engine.stats()["evictions"], 1)
+
+        # An evicted program is compiled again on demand
+        result, _, out_array = engine.run(SUB, [50, 20] + [0] * 254, [0] * 256)
+        self.assertEqual(result, 0)
+        self.assertEqual(out_array[2], 30)
+        self.assertEqual(engine.stats()["misses"], 4)
+
+    def test_run_batch(self):
+        engine = Engine()
+        in_records = [[i, 2 * i] + [0] * 254 for i in range(100)]
+        out_records = [[0] * 256 for _ in range(100)]
+        results, _, actual_out_records = engine.run_batch(ADD, in_records, out_records)
+        self.assertEqual(results, [0] * 100)
+        self.assertEqual([record[2] for record in actual_out_records], [3 * i for i in range(100)])
+
+    def test_native_byteorder(self):
+        engine = Engine(byteorder="little")
+        in_array = [2**255 + 1, 2**255 + 2**64] + [0] * 254
+        result, _, out_array = engine.run(ADD, in_array, [0] * 256)
+        self.assertEqual(result, 0)
+        self.assertEqual(out_array[2], 2**64 + 1)
+
+    def test_run_simd(self):
+        engine = Engine(simd_lanes=4)
+        in_records = [[i, 2 * i] + [0] * 254 for i in range(10)]
+        out_records = [[0] * 256 for _ in range(10)]
+        results, _, actual_out_records = engine.compile(ADD).run_simd(in_records, out_records)
+        self.assertEqual(results, [0] * 10)
+        self.assertEqual([record[2] for record in actual_out_records], [3 * i for i in range(10)])
+
+        # Programs that may fail only have the scalar entry points
+        program = engine.compile(parse_assembly("POP\nSTOP"))
+        self.assertEqual(program.run([0] * 256, [0] * 256)[0], 2)
+        with self.assertRaises(ValueError):
+            program.run_simd(in_records, out_records)
+
+    def test_incremental(self):
+        prefix = parse_assembly('''
+            LOAD 0
+            LOAD 1
+            ADD
+            STORE 2
+            POP
+            LOAD 2
+            DUP
+            ADD
+            STORE 3
+            POP
+            STOP
+        ''')[:-1]
+        tail1 = parse_assembly("LOAD 3\nLOAD 0\nSUB\nSTORE 4\nSTOP")
+        tail2 = parse_assembly("LOAD 3\nLOAD 1\nSUB\nSTORE 4\nPOP\nPOP\nSTOP")
+        self.assertEqual([len(fragment) for fragment in split_fragments(prefix + tail1, 4)], [5, 5, 4])
+
+        engine = Engine(fragment_size=4, cache_size=1)
+        in_array = [5, 3, 7, 20] + [0] * 252
+        result, _, out_array = engine.run(prefix + tail1, in_array, [0] * 256)
+        self.assertEqual((result, out_array[2:5]), (0, [8, 14, 15]))
+        self.assertEqual(engine.stats()["fragment_misses"], 3)
+
+        # The variant reuses the fragments of the prefix, and reports its stack error
+        result, _, out_array = engine.run(prefix + tail2, in_array, [0] * 256)
+        self.assertEqual((result, out_array[2:5]), (2, [8, 14, 17]))
+        stats = engine.stats()
+        self.assertEqual((stats["fragment_hits"], stats["fragment_misses"]), (2, 5))
+
+        # Evicting the first program freed the fragment only it used
+        self.assertEqual(stats["fragments"], 4)
+
+    def test_shared_runtime(self):
+        for opt_level in (0, 2):
+            engine = Engine(opt_level=opt_level, shared_runtime=True)
+            result, _, out_array = engine.run(ADD, [2, 3] + [0] * 254, [0] * 256)
+            self.assertEqual((result, out_array[2]), (0, 5))
+            self.assertEqual(engine.run(parse_assembly("POP\nSTOP"), [0] * 256, [0] * 256)[0], 2)
+            self.assertEqual(engine.run(parse_assembly("\n".join(["LOAD 0"] * 1025 + ["STOP"])), [0] * 256, [0] * 256)[0], 1)
+        self.assertIn('declare void @"stack_push"', str(compile_bytecode(ADD, runtime=True)))
+
+    def test_concurrent_errors(self):
+        # Each call has its own status slot: failing calls do not affect concurrent ones
+        engine = Engine(opt_level=0)
+        failing = engine.compile(parse_assembly("LOAD 0\nPOP\nPOP\nSTOP"))
+        adding = engine.compile(ADD)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(failing.run, [0] * 256, [0] * 256) if i % 2 else executor.submit(adding.run, [i, 1] + [0] * 254, [0] * 256)
+                       for i in range(200)]
+            results = [future.result() for future in futures]
+        for i, (result, _, out_array) in enumerate(results):
+            self.assertEqual(result, 2 if i % 2 else 0)
+            if not i % 2:
+                self.assertEqual(out_array[2], i + 1)
+
+    def test_hit_during_compilation(self):
+        # Cache hits do not wait for a compilation in progress on another thread
+        engine = Engine(opt_level=0)
+        program = engine.compile(ADD)
+        with engine.compile_lock, ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertIs(executor.submit(engine.compile, ADD).result(timeout=5), program)
+        self.assertEqual(engine.stats()["hits"], 1)
+
+        # Concurrent misses on one program compile it once
+        engine = Engine(opt_level=0)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            programs = list(executor.map(engine.compile, [SUB] * 16))
+        self.assertTrue(all(program is programs[0] for program in programs))
+        self.assertEqual(engine.stats()["misses"], 1)
+
+    def test_code_budget(self):
+        engine = Engine(opt_level=0, shared_runtime=False)
+        program = engine.compile(ADD)
+        footprint = engine.footprints()[program.name]
+        self.assertGreater(footprint["code_bytes"], 0)
+        self.assertGreater(footprint["ir_bytes"], 0)
+        self.assertGreaterEqual(engine.stats()["code_bytes"], footprint["code_bytes"])
+        self.assertGreater(engine.stats()["resident_bytes"], 0)
+
+        # The budget only fits one program
+        budget = footprint["code_bytes"] + footprint["ir_bytes"] + 1000
+        engine = Engine(opt_level=0, shared_runtime=False, code_budget=budget)
+        engine.compile(ADD)
+        engine.compile(SUB)
+        stats = engine.stats()
+        self.assertEqual((stats["size"], stats["evictions"]), (1, 1))
+        self.assertLessEqual(stats["code_bytes"] + stats["ir_bytes"], budget)
+        self.assertGreater(stats["retired_bytes"], 0)
+
+    def test_recycle(self):
+        # Any retired code starts a new execution engine on the next miss
+        engine = Engine(cache_size=1, opt_level=0, recycle_bytes=1)
+        add = engine.compile(ADD)
+        sub = engine.compile(SUB)
+        dup = engine.compile(DUP)
+        stats = engine.stats()
+        self.assertEqual((stats["recycles"], stats["retired_bytes"]), (1, 0))
+        self.assertIsNot(add.generation, dup.generation)
+
+        # Programs of the old execution engine keep it alive
+        in_array = [10, 3] + [0] * 254
+        self.assertEqual(add.run(in_array, [0] * 256)[2][2], 13)
+        self.assertEqual(sub.run(in_array, [0] * 256)[2][2], 7)
+        self.assertEqual(dup.run(in_array, [0] * 256)[2][:2], [10, 10])
+        self.assertEqual(engine.run(ADD, in_array, [0] * 256)[2][2], 13)
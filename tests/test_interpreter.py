@@ -0,0 +1,82 @@
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.engine import Engine
+from bytecode_compiler.interpreter import interpret, interpret_batch
+from bytecode_compiler.differential import differential_test
+from bytecode_compiler.policy import CrossoverPolicy
+
+class TestInterpreter(unittest.TestCase):
+
+    def test_operations(self):
+        bytecode = parse_assembly('''
+            LOAD 0
+            LOAD 1
+            ADD
+            DUP
+            STORE 2
+            STORE 3
+            POP
+            LOAD 4
+            LOAD 0
+            SUB
+            STORE 5
+            STOP
+            STORE 6
+        ''')
+        in_array = [5, 2**256 - 1, 0, 0, 3] + [0] * 251
+        result, _, out_array = interpret(bytecode, in_array, [0] * 256)
+        self.assertEqual(result, 0)
+        self.assertEqual(out_array, [0, 0, 4, 4, 0, 2**256 - 2] + [0] * 250)
+
+    def test_errors(self):
+        result, _, out_array = interpret(parse_assembly("LOAD 0\nSTORE 1\nADD\nSTORE 2\nSTOP"), [7] * 256, [0] * 256)
+        self.assertEqual(result, 2)
+        self.assertEqual(out_array, [0, 7] + [0] * 254)
+        result, _, _ = interpret(parse_assembly("\n".join(['LOAD 0'] * 1025 + ['STOP'])), [7] * 256, [0] * 256)
+        self.assertEqual(result, 1)
+
+    def test_batch(self):
+        bytecode = parse_assembly("LOAD 0\nLOAD 1\nSUB\nSTORE 0\nSTOP")
+        results, _, out_records = interpret_batch(bytecode, [[3, 1] + [0] * 254, [1, 3] + [0] * 254], [[0] * 256] * 2)
+        self.assertEqual(results, [0, 0])
+        self.assertEqual([out_array[0] for out_array in out_records], [2, 2**256 - 2])
+
+    def test_differential(self):
+        report = differential_test(Engine(opt_level=0), programs=10, lengths=(5, 40), runs=3, error_rate=0.1)
+        self.assertEqual(report["mismatches"], [])
+        self.assertEqual(len(report["latency"]), 2)
+
+        # Narrow words and a small stack, where overflows are frequent
+        report = differential_test(Engine(opt_level=0, word_size=64, capacity=4), programs=10, lengths=(20,), runs=3, error_rate=0.1)
+        self.assertEqual(report["mismatches"], [])
+
+        # Failing programs are rejected at compile time with stack promotion
+        report = differential_test(Engine(opt_level=0, promote_stack=True), programs=10, lengths=(20,), runs=3, error_rate=0.3)
+        self.assertEqual(report["mismatches"], [])
+
+    def test_crossover_policy(self):
+        bytecode = parse_assembly("LOAD 0\nLOAD 1\nADD\nSTORE 2\nSTOP")
+        policy = CrossoverPolicy(interpreter_base=1e-5, interpreter_per_instruction=1e-6,
+                                 compile_base=1e-2, compile_per_instruction=1e-3, jit_run=1e-6)
+        self.assertEqual(policy.backend(bytecode, runs=1), "interpreter")
+        self.assertEqual(policy.backend(bytecode, runs=100000), "jit")
+
+        report = {"latency": [
+            {"length": 10, "interpreter_run": 2e-5, "jit_compile": 0.02, "jit_run": 1e-6},
+            {"length": 100, "interpreter_run": 1.1e-4, "jit_compile": 0.11, "jit_run": 1e-6},
+        ]}
+        policy = CrossoverPolicy.from_report(report)
+        self.assertAlmostEqual(policy.interpreter_per_instruction, 1e-6)
+        self.assertAlmostEqual(policy.compile_base, 0.01)
+
+        # Once compiled, a program stays on the JIT
+        policy.engine = Engine(opt_level=0)
+        result, _, out_array = policy.run(bytecode, [1, 2] + [0] * 254, [0] * 256, runs=1000000)
+        self.assertEqual((result, out_array[2]), (0, 3))
+        self.assertEqual(policy.backend(bytecode, runs=1), "jit")
+
+        # The interpreter uses the word size of the engine
+        policy.engine = Engine(opt_level=0, word_size=64)
+        in_array = [2**64 - 1, 2] + [0] * 254
+        self.assertEqual(policy.run(bytecode, in_array, [0] * 256, runs=1)[2][2], 1)
+        self.assertEqual(policy.run(bytecode, in_array, [0] * 256, runs=1000000)[2][2], 1)
@@ -0,0 +1,71 @@
+import unittest
+from bytecode_compiler.parser import parse_assembly, errCode
+from bytecode_compiler.compiler import compile_library
+from bytecode_compiler.library import ProgramLibrary
+
+ADD = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+SUB = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    SUB
+    STORE 2
+    STOP
+''')
+
+UNDERFLOW = parse_assembly('''
+    LOAD 0
+    POP
+    POP
+    STOP
+''')
+
+class TestLibrary(unittest.TestCase):
+
+    def test_run(self):
+        library = ProgramLibrary([ADD, SUB, UNDERFLOW])
+        self.assertEqual(len(library), 3)
+        self.assertEqual(library.index(SUB), 1)
+        in_array = [10, 3] + [0] * 254
+        result, _, out_array = library.run(0, in_array, [0] * 256)
+        self.assertEqual((result, out_array[2]), (0, 13))
+        result, _, out_array = library.run(1, in_array, [0] * 256)
+        self.assertEqual((result, out_array[2]), (0, 7))
+        result, _, _ = library.run(2, in_array, [0] * 256)
+        self.assertEqual(result, errCode["empty"])
+        with self.assertRaises(IndexError):
+            library.run(3, in_array, [0] * 256)
+        with self.assertRaises(ValueError):
+            library.index(parse_assembly("STOP"))
+
+    def test_invalid_id(self):
+        # The native entry point reports unknown ids itself
+        library = ProgramLibrary([ADD], opt_level=0)
+        self.assertEqual(library.cfunc(1, None, None), errCode["invalid"])
+        self.assertEqual(library.cfunc(-1, None, None), errCode["invalid"])
+
+    def test_run_batch(self):
+        library = ProgramLibrary([ADD, SUB])
+        in_records = [[i, 1] + [0] * 254 for i in range(5)]
+        results, _, out_records = library.run_batch(1, in_records, [[0] * 256 for _ in range(5)])
+        self.assertEqual(results, [0] * 5)
+        self.assertEqual([out[2] for out in out_records], [(i - 1) % 2**256 for i in range(5)])
+
+    def test_close(self):
+        with ProgramLibrary([ADD], opt_level=0) as library:
+            self.assertEqual(library.run(0, [1, 2] + [0] * 254, [0] * 256)[2][2], 3)
+        self.assertFalse(library.finalizer.alive)
+        library.close()
+
+    def test_compile_errors(self):
+        with self.assertRaisesRegex(ValueError, "Program 1"):
+            compile_library([ADD, UNDERFLOW], promote_stack=True)
+
+if __name__ == '__main__':
+    unittest.main()
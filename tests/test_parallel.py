@@ -0,0 +1,37 @@
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.engine import Engine
+from bytecode_compiler.parallel import ParallelRunner
+
+ADD = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+UNDERFLOW = parse_assembly('''
+    LOAD 0
+    STORE 1
+    ADD
+    STOP
+''')
+
+class TestParallelRunner(unittest.TestCase):
+
+    def test_run(self):
+        jobs = []
+        for i in range(20):
+            bytecode = UNDERFLOW if i % 7 == 3 else ADD
+            jobs.append((bytecode, [i, 2**255 + i] + [0] * 254))
+
+        with ParallelRunner(workers=2, chunk_size=3) as runner:
+            results = runner.run(jobs)
+            self.assertEqual(runner.run([]), [])
+
+        engine = Engine()
+        expected = [engine.run(bytecode, in_array, [0] * 256)[::2] for bytecode, in_array in jobs]
+        self.assertEqual(results, expected)
+        self.assertEqual(results[3][0], 2)
+        self.assertEqual(results[4], (0, [0, 0, 2**255 + 8] + [0] * 253))
@@ -0,0 +1,92 @@
+import random
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.peephole import optimize_bytecode, remove_dead_stores, remove_dead_values, reuse_loads
+from bytecode_compiler.differential import random_program, random_array
+from bytecode_compiler.interpreter import interpret
+from bytecode_compiler.engine import Engine
+
+class TestPeephole(unittest.TestCase):
+
+    def test_rules(self):
+        bytecode = parse_assembly('''
+            LOAD 0
+            LOAD 1
+            POP
+            DUP
+            POP
+            STORE 5
+            LOAD 2
+            LOAD 2
+            ADD
+            STORE 3
+            STORE 3
+            LOAD 4
+            LOAD 1
+            SUB
+            STOP
+        ''')
+        optimized, report = optimize_bytecode(bytecode)
+        self.assertEqual(optimized, parse_assembly('''
+            LOAD 0
+            STORE 5
+            LOAD 2
+            DUP
+            ADD
+            STORE 3
+            STOP
+        '''))
+        self.assertEqual(report["before"], 15)
+        self.assertEqual(report["after"], 7)
+        self.assertEqual(report["removed"]["remove_dead_stores"], 1)
+        self.assertIsNone(report["skipped"])
+
+    def test_dead_add_of_stored_value(self):
+        bytecode = [[0x01, 0], [0x02, 0], [0x01, 1], [0x04], [0x03], [0x00]]
+        self.assertEqual(remove_dead_values(bytecode), [[0x01, 0], [0x02, 0], [0x03], [0x00]])
+        self.assertEqual(reuse_loads([[0x01, 3], [0x01, 3], [0x01, 3]]), [[0x01, 3], [0x06], [0x01, 3]])
+
+    def test_custom_rules(self):
+        # The code after STOP is dropped before the rules run, so it cannot hide live STOREs
+        bytecode = [[0x01, 0], [0x02, 1], [0x00], [0x01, 0], [0x02, 1]]
+        optimized, report = optimize_bytecode(bytecode, rules=[remove_dead_stores])
+        self.assertEqual(optimized, [[0x01, 0], [0x02, 1], [0x00]])
+        self.assertEqual(report["removed"], {"remove_dead_stores": 0, "remove_after_stop": 2})
+        self.assertEqual(interpret(optimized, [7] * 256, [0] * 256)[2][1], 7)
+
+    def test_skips_failing_programs(self):
+        bytecode = parse_assembly('''
+            LOAD 0
+            POP
+            POP
+            STOP
+        ''')
+        optimized, report = optimize_bytecode(bytecode)
+        self.assertEqual(optimized, bytecode)
+        self.assertEqual(report["skipped"], "Stack underflow at instruction 2")
+
+    def test_same_results(self):
+        rng = random.Random(0)
+        for i in range(300):
+            bytecode = random_program(rng, rng.randint(1, 40), 0.05 if i % 2 else 0.0)
+            optimized, _ = optimize_bytecode(bytecode)
+            in_array = random_array(rng)
+            out_array = random_array(rng)
+            self.assertEqual(interpret(optimized, in_array, out_array), interpret(bytecode, in_array, out_array))
+
+    def test_engine(self):
+        bytecode = parse_assembly('''
+            LOAD 0
+            LOAD 0
+            ADD
+            STORE 0
+            LOAD 1
+            POP
+            STOP
+        ''')
+        engine = Engine(peephole=True)
+        result, _, out_array = engine.run(bytecode, [5] * 256, [0] * 256)
+        self.assertEqual((result, out_array[0]), (0, 10))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 from bytecode_compiler.parser import parse_assembly
-from bytecode_compiler.compiler import compile_bytecode
-from bytecode_compiler.execution import execute
+from bytecode_compiler.compiler import compile_bytecode, create_target_machine
+from bytecode_compiler.execution import execute, execute_batch, execute_buffer, execute_batch_buffer, execute_simd, to_simd_layout, from_simd_layout
 
 class TestIntegration(unittest.TestCase):
 
@@ -156,5 +156,221 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(actual_out_array, expected_out_array)
         self.assertEqual(result, 0)
 
+    def test_batch(self):
+        assembly_code = '''
+            LOAD 0
+            LOAD 1
+            SUB
+            STORE 2
+            STOP
+        '''
+        in_records = [[50, 20] + [0] * 254, [7, 3] + [0] * 254, [1, 1] + [0] * 254]
+        out_records = [[0] * 256, [0] * 256, [9] * 256]
+        module = compile_bytecode(parse_assembly(assembly_code), batch=True)
+
+        results, actual_in_records, actual_out_records = execute_batch(in_records, out_records, module)
+        self.assertEqual(results, [0, 0, 0])
+        self.assertEqual(actual_in_records, in_records)
+        self.assertEqual(actual_out_records, [[0, 0, 30] + [0] * 253, [0, 0, 4] + [0] * 253, [9, 9, 0] + [9] * 253])
+
+    def test_batch_status(self):
+        module = compile_bytecode(parse_assembly("STORE 0\nSTOP"), batch=True)
+        results, _, _ = execute_batch([[0] * 256] * 2, [[0] * 256] * 2, module)
+        self.assertEqual(results, [2, 2])
+
+    def test_buffer(self):
+        module = compile_bytecode(parse_assembly("LOAD 3\nSTORE 1\nSTOP"))
+        in_buffer = bytearray(256 * 32)
+        in_buffer[3 * 32:4 * 32] = (1234).to_bytes(32, 'big')
+        out_buffer = memoryview(bytearray(256 * 32))
+
+        result = execute_buffer(in_buffer, out_buffer, module)
+        self.assertEqual(result, 0)
+        self.assertEqual(int.from_bytes(out_buffer[32:64], 'big'), 1234)
+
+        with self.assertRaises(ValueError):
+            execute_buffer(bytes(in_buffer), out_buffer, module)
+        with self.assertRaises(ValueError):
+            execute_buffer(in_buffer, bytearray(32), module)
+
+    def test_batch_buffer(self):
+        module = compile_bytecode(parse_assembly("LOAD 0\nDUP\nSTORE 0\nSTORE 1\nSTOP"), batch=True)
+        in_buffer = bytearray(3 * 256 * 32)
+        for i in range(3):
+            in_buffer[i * 256 * 32:i * 256 * 32 + 32] = (i + 1).to_bytes(32, 'big')
+        out_buffer = bytearray(3 * 256 * 32)
+
+        results = execute_batch_buffer(in_buffer, out_buffer, module)
+        self.assertEqual(list(results), [0, 0, 0])
+        for i in range(3):
+            offset = i * 256 * 32
+            self.assertEqual(int.from_bytes(out_buffer[offset:offset + 32], 'big'), i + 1)
+            self.assertEqual(int.from_bytes(out_buffer[offset + 32:offset + 64], 'big'), i + 1)
+
+    def test_byteorder(self):
+        assembly_code = '''
+            LOAD 0
+            LOAD 1
+            ADD
+            STORE 2
+            LOAD 0
+            LOAD 1
+            SUB
+            STORE 3
+            STOP
+        '''
+        in_array = [2**200 + 255, 2**100 + 1] + [0] * 254
+        expected_out_array = [0, 0, 2**200 + 2**100 + 256, 2**200 - 2**100 + 254] + [0] * 252
+        for byteorder in ("big", "little"):
+            module = compile_bytecode(parse_assembly(assembly_code), byteorder=byteorder)
+            result, _, actual_out_array = execute(in_array, [0] * 256, module, byteorder)
+            self.assertEqual(actual_out_array, expected_out_array)
+            self.assertEqual(result, 0)
+
+        with self.assertRaises(ValueError):
+            compile_bytecode(parse_assembly(assembly_code), byteorder="middle")
+
+    def test_pop_error_code(self):
+        # Popping an empty stack stops execution with the 'empty' error code
+        assembly_code = '''
+            POP
+            LOAD 0
+            STORE 0
+            STOP
+        '''
+        result, _, actual_out_array = self.parse_compile_execute(assembly_code, [7] * 256, [0] * 256)
+        self.assertEqual(actual_out_array, [0] * 256)
+        self.assertEqual(result, 2)
+
+    def test_promote_stack(self):
+        assembly_code = '''
+            LOAD 0
+            LOAD 1
+            ADD
+            DUP
+            STORE 2
+            STORE 3
+            POP
+            LOAD 4
+            LOAD 0
+            SUB
+            STORE 5
+            STOP
+        '''
+        in_array = [5, 10, 0, 0, 8] + [0] * 251
+        expected_out_array = [0, 0, 15, 15, 0, 3] + [0] * 250
+        module = compile_bytecode(parse_assembly(assembly_code), promote_stack=True)
+        self.assertNotIn("alloca", str(module))
+        self.assertNotIn("stack_", str(module))
+
+        result, _, actual_out_array = execute(in_array, [0] * 256, module)
+        self.assertEqual(actual_out_array, expected_out_array)
+        self.assertEqual(result, 0)
+
+    def test_promote_stack_errors(self):
+        with self.assertRaises(ValueError) as context:
+            compile_bytecode(parse_assembly("LOAD 0\nPOP\nSTORE 1\nSTOP"), promote_stack=True)
+        self.assertIn("underflow at instruction 2", str(context.exception))
+        with self.assertRaises(ValueError) as context:
+            compile_bytecode(parse_assembly("\n".join(['LOAD 0'] * 1025 + ['STOP'])), promote_stack=True)
+        self.assertIn("overflow at instruction 1024", str(context.exception))
+
+    def test_opt_levels(self):
+        assembly_code = '''
+            LOAD 0
+            LOAD 1
+            ADD
+            DUP
+            STORE 2
+            STORE 3
+            POP
+            LOAD 4
+            STORE 5
+            POP
+            STOP
+        '''
+        in_array = [5, 10, 0, 0, 8] + [0] * 251
+        expected_out_array = [0, 0, 15, 15, 0, 8] + [0] * 250
+        for opt_level in range(4):
+            module = compile_bytecode(parse_assembly(assembly_code), opt_level=opt_level)
+            if opt_level > 0:
+                # The stack helpers have been inlined
+                self.assertNotIn("call i256 @stack_", str(module))
+            result, _, actual_out_array = execute(in_array, [0] * 256, module)
+            self.assertEqual(actual_out_array, expected_out_array)
+            self.assertEqual(result, 0)
+
+        with self.assertRaises(ValueError):
+            compile_bytecode(parse_assembly(assembly_code), opt_level=4)
 
-            
\ No newline at end of file
+    def test_shared_target_machine(self):
+        # Each execution engine gets its own copy of the caller's target machine
+        target_machine = create_target_machine(2)
+        module = compile_bytecode(parse_assembly("LOAD 0\nLOAD 1\nADD\nSTORE 2\nSTOP"), opt_level=2, target_machine=target_machine)
+        for i in range(3):
+            result, _, out_array = execute([i, 1] + [0] * 254, [0] * 256, module, target_machine=target_machine)
+            self.assertEqual((result, out_array[2]), (0, i + 1))
+        self.assertIsNotNone(target_machine.emit_assembly(module))
+
+    def test_simd(self):
+        bytecode = parse_assembly('''
+            LOAD 0
+            LOAD 1
+            ADD
+            STORE 2
+            LOAD 1
+            SUB
+            STORE 3
+            STOP
+        ''')
+        in_records = [[2**256 - 1 - i, 2**64 + i] + [i] * 254 for i in range(5)]
+        out_records = [[0] * 256 for _ in range(5)]
+        self.assertEqual(from_simd_layout(to_simd_layout(in_records, 4), 5, 4), in_records)
+        module = compile_bytecode(bytecode, batch=True, simd_lanes=4)
+        self.assertEqual(execute_simd(in_records, out_records, module, 4), execute_batch(in_records, out_records, module))
+        with self.assertRaises(ValueError):
+            execute_simd(in_records, out_records, module, 2)
+
+        # Lane counts that are not a power of two
+        for lanes in (1, 3, 5):
+            module = compile_bytecode(bytecode, batch=True, simd_lanes=lanes, word_size=64)
+            records = [list(range(i, i + 256)) for i in range(7)]
+            zeros = [[0] * 256 for _ in range(7)]
+            self.assertEqual(execute_simd(records, zeros, module, lanes, word_size=64),
+                             execute_batch(records, zeros, module, word_size=64))
+
+        with self.assertRaises(ValueError):
+            compile_bytecode(parse_assembly("POP\nSTOP"), simd_lanes=4)
+
+    def test_word_sizes(self):
+        bytecode = parse_assembly('''
+            LOAD 0
+            LOAD 1
+            ADD
+            STORE 2
+            LOAD 1
+            SUB
+            STORE 3
+            STOP
+        ''')
+        for word_size in (64, 128):
+            # Words wrap around modulo 2^word_size
+            in_array = [2**word_size - 1, 2] + [0] * 254
+            expected_out_array = [0, 0, 1, 2**word_size - 1] + [0] * 252
+            for promote_stack in (False, True):
+                module = compile_bytecode(bytecode, batch=True, byteorder="little", promote_stack=promote_stack, word_size=word_size)
+                result, _, out_array = execute(in_array, [0] * 256, module, "little", word_size=word_size)
+                self.assertEqual((result, out_array), (0, expected_out_array))
+            results, _, out_records = execute_batch([in_array] * 3, [[0] * 256] * 3, module, "little", word_size=word_size)
+            self.assertEqual((results, out_records), ([0] * 3, [expected_out_array] * 3))
+            module = compile_bytecode(bytecode, simd_lanes=4, word_size=word_size)
+            self.assertEqual(execute_simd([in_array] * 5, [[0] * 256] * 5, module, 4, word_size=word_size)[2], [expected_out_array] * 5)
+
+        # A smaller stack overflows sooner
+        module = compile_bytecode(parse_assembly("LOAD 0\nDUP\nDUP\nSTOP"), capacity=2)
+        self.assertEqual(execute([0] * 256, [0] * 256, module)[0], 1)
+
+        with self.assertRaises(ValueError):
+            compile_bytecode(bytecode, word_size=32)
+        with self.assertRaises(ValueError):
+            compile_bytecode(bytecode, capacity=0)
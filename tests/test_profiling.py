@@ -0,0 +1,49 @@
+import json
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.compiler import compile_bytecode
+from bytecode_compiler.execution import execute
+from bytecode_compiler.engine import Engine
+from bytecode_compiler.profiling import Profiler
+
+PROGRAM = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+class TestProfiling(unittest.TestCase):
+
+    def test_execute_phases(self):
+        profiler = Profiler()
+        module = compile_bytecode(PROGRAM, instrument=True, profiler=profiler)
+        result, _, out_array = execute([1, 2] + [0] * 254, [0] * 256, module, profiler=profiler)
+        self.assertEqual((result, out_array[2]), (0, 3))
+
+        stats = json.loads(profiler.to_json())
+        for phase in ("ir_build", "ir_to_text", "parse_ir", "verify", "jit", "marshal", "native_call"):
+            self.assertIn(phase, stats["phases"])
+        self.assertEqual(stats["phases"]["marshal"]["calls"], 2)
+        self.assertEqual(profiler.counters["opcodes"]["LOAD"], 2)
+        self.assertEqual(profiler.counters["results"], {0: 1, 1: 0, 2: 0, 3: 0})
+
+    def test_engine_counters(self):
+        engine = Engine(instrument=True)
+        program = engine.compile(PROGRAM)
+        program.run_batch([[0] * 256] * 3, [[0] * 256] * 3)
+        counters = program.counters(reset=True)
+        self.assertEqual(counters["opcodes"]["ADD"], 3)
+        self.assertEqual(counters["results"][0], 3)
+        self.assertEqual(program.counters()["opcodes"]["ADD"], 0)
+
+        failing = engine.compile(parse_assembly("POP\nSTOP"))
+        failing.run([0] * 256, [0] * 256)
+        self.assertEqual(failing.counters()["results"][2], 1)
+
+        with self.assertRaises(ValueError):
+            Engine().compile(PROGRAM).counters()
+
+if __name__ == '__main__':
+    unittest.main()
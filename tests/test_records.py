@@ -0,0 +1,64 @@
+import io
+import os
+import tempfile
+import unittest
+from bytecode_compiler.parser import max_array_size, get_record_size
+from bytecode_compiler.records import iter_text_records, write_text_record, BinaryRecordReader, map_records, words_into, words_from
+from bytecode_compiler.cli import parse_args, run_stream
+
+class TestRecords(unittest.TestCase):
+
+    def test_text_records(self):
+        f = io.StringIO("# first\n1\n2\n---\n\n3\n---\n4\n")
+        records = list(iter_text_records(f))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0][:3], [1, 2, 0])
+        self.assertEqual(records[2][0], 4)
+        self.assertTrue(all(len(record) == max_array_size for record in records))
+        with self.assertRaises(ValueError):
+            list(iter_text_records(io.StringIO("1\nx\n")))
+
+        out = io.StringIO()
+        write_text_record(out, [5, 6], 1)
+        self.assertEqual(out.getvalue(), "# result: 1\n5\n6\n---\n")
+
+    def test_binary_records(self):
+        record_size = get_record_size()
+        data = bytearray(3 * record_size)
+        for r in range(3):
+            words_into(data, r * record_size, [r, 2**255], "little")
+        reader = BinaryRecordReader(io.BytesIO(bytes(data)), chunk_records=2)
+        chunks = [bytes(chunk) for chunk in reader]
+        self.assertEqual([len(chunk) for chunk in chunks], [2 * record_size, record_size])
+        self.assertEqual(words_from(chunks[1], 0, 2, "little"), [2, 2**255])
+        with self.assertRaises(ValueError):
+            BinaryRecordReader(io.BytesIO(bytes(10))).read_chunk()
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "in.bin")
+            with open(filename, "wb") as f:
+                f.write(data)
+            mapped = map_records(filename)
+            self.assertEqual(words_from(mapped, 2 * record_size, 1, "little"), [2])
+            mapped.release()
+
+    def test_stream(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {name: os.path.join(directory, name) for name in ("in.txt", "out.txt", "result.txt", "status")}
+            with open(paths["in.txt"], "w") as f:
+                for i in range(5):
+                    f.write(f"{i}\n10\n---\n")
+            with open(paths["out.txt"], "w") as f:
+                f.write("7\n")
+            args = parse_args(["prog.asm", paths["in.txt"], paths["out.txt"], "--stream", paths["result.txt"],
+                               "--chunk-size", "2", "--status", paths["status"]])
+            results = run_stream([[0x01, 0], [0x01, 1], [0x04], [0x02, 0], [0x03], [0x03], [0x00]], args)
+            self.assertEqual(results, {2: 5})
+            with open(paths["result.txt"]) as f:
+                records = list(iter_text_records(f))
+            self.assertEqual([record[0] for record in records], [10 + i for i in range(5)])
+            with open(paths["status"], "rb") as f:
+                self.assertEqual(f.read(), bytes([2] * 5))
+
+if __name__ == '__main__':
+    unittest.main()
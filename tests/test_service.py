@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import asyncio
+import functools
+import tempfile
+import unittest
+import subprocess
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.service import AsyncRuntime, serve
+from bytecode_compiler.client import run_remote
+
+ASSEMBLY = '''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+'''
+ADD = parse_assembly(ASSEMBLY)
+
+class TestService(unittest.TestCase):
+
+    def test_coalescing(self):
+        async def scenario():
+            async with AsyncRuntime(max_batch_size=16, max_wait=0.05) as runtime:
+                requests = [runtime.run(ADD, [i, 1] + [0] * 254) for i in range(40)]
+                requests.append(runtime.run(parse_assembly("POP\nSTOP"), [0] * 256))
+                results = await asyncio.gather(*requests)
+                with self.assertRaises(ValueError):
+                    await runtime.run(ADD, [0])
+
+                # A bad word only fails its own request, not its batch
+                requests = [runtime.run(ADD, [1, 2] + [0] * 254), runtime.run(ADD, [-1] + [0] * 255),
+                            runtime.run(ADD, [0] * 256, [2**256] + [0] * 255)]
+                outcomes = await asyncio.gather(*requests, return_exceptions=True)
+                self.assertEqual(outcomes[0][1][2], 3)
+                self.assertIsInstance(outcomes[1], ValueError)
+                self.assertIsInstance(outcomes[2], ValueError)
+                return results, runtime.stats()
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual([(result, out_array[2]) for result, out_array in results[:40]], [(0, i + 1) for i in range(40)])
+        self.assertEqual(results[40][0], 2)
+        self.assertEqual(stats["requests"], 42)
+        # Batches of 16, 16 and 8 requests for ADD, one for the failing program and one for the last ADD
+        self.assertEqual(stats["batches"], 5)
+
+    def test_server(self):
+        async def scenario():
+            async with AsyncRuntime(max_wait=0.01) as runtime:
+                server = await serve(runtime)
+                host, port = server.sockets[0].getsockname()[:2]
+                reader, writer = await asyncio.open_connection(host, port)
+                for i in range(5):
+                    writer.write(json.dumps({"id": i, "program": ASSEMBLY, "in": [i, 2] + [0] * 254}).encode() + b"\n")
+                writer.write(b'{"id": 5, "program": "JUMP", "in": []}\n')
+                await writer.drain()
+                responses = [json.loads(await reader.readline()) for _ in range(6)]
+                writer.close()
+                server.close()
+                await server.wait_closed()
+                return {response["id"]: response for response in responses}, runtime.stats()
+
+        responses, stats = asyncio.run(scenario())
+        for i in range(5):
+            self.assertEqual(responses[i]["result"], 0)
+            self.assertEqual(responses[i]["out"][2], i + 2)
+        self.assertIn("Unknown command", responses[5]["error"])
+        self.assertEqual(stats["batches"], 1)
+
+    def test_client(self):
+        async def scenario(path):
+            async with AsyncRuntime(max_wait=0.001) as runtime:
+                server = await serve(runtime, path=path)
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(None, run_remote, path, ASSEMBLY, [3, 4] + [0] * 254, [0] * 256)
+                with self.assertRaises(ValueError):
+                    await loop.run_in_executor(None, run_remote, path, "JUMP", [0] * 256, [0] * 256)
+                # A request for another layout is rejected
+                remote = functools.partial(run_remote, path, ASSEMBLY, [3, 4] + [0] * 254, [0] * 256)
+                self.assertEqual((await loop.run_in_executor(None, functools.partial(remote, word_size=256, capacity=1024)))[1][2], 7)
+                with self.assertRaises(ValueError):
+                    await loop.run_in_executor(None, functools.partial(remote, word_size=64))
+                with self.assertRaises(ValueError):
+                    await loop.run_in_executor(None, functools.partial(remote, capacity=2))
+                server.close()
+                await server.wait_closed()
+                return result
+
+        with tempfile.TemporaryDirectory() as directory:
+            result, out_array = asyncio.run(scenario(os.path.join(directory, "daemon.sock")))
+        self.assertEqual((result, out_array[2]), (0, 7))
+
+        # The command line and the client start without loading LLVM
+        code = "import sys, bytecode_compiler.cli, bytecode_compiler.client; print('llvmlite' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip(), "False")
+
+if __name__ == '__main__':
+    unittest.main()
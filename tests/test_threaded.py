@@ -0,0 +1,44 @@
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.threaded import ThreadedRunner
+
+ADD = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+UNDERFLOW = parse_assembly('''
+    LOAD 0
+    STORE 1
+    ADD
+    STOP
+''')
+
+class TestThreadedRunner(unittest.TestCase):
+
+    def check(self, **engine_options):
+        jobs = [(ADD, [i, 2**128] + [0] * 254) for i in range(200)]
+        if not engine_options.get("promote_stack"):
+            jobs += [(UNDERFLOW, [i] + [0] * 255) for i in range(200)]
+        with ThreadedRunner(workers=8, **engine_options) as runner:
+            results = runner.map(jobs)
+            self.assertEqual(runner.engine.stats()["misses"], len({id(bytecode) for bytecode, _ in jobs}))
+        for i in range(200):
+            self.assertEqual(results[i], (0, [0, 0, i + 2**128] + [0] * 253))
+        for i in range(200, len(jobs)):
+            self.assertEqual(results[i], (2, [0, i - 200] + [0] * 254))
+
+    def test_map(self):
+        self.check()
+
+    def test_map_promoted_stack(self):
+        self.check(promote_stack=True)
+
+    def test_out_array(self):
+        with ThreadedRunner(workers=1) as runner:
+            result, out_array = runner.run(ADD, [1, 2] + [0] * 254, [5] * 256)
+        self.assertEqual(result, 0)
+        self.assertEqual(out_array, [5, 5, 3] + [5] * 253)
@@ -0,0 +1,54 @@
+import unittest
+from bytecode_compiler.parser import parse_assembly
+from bytecode_compiler.tiered import TieredRuntime
+
+ADD = parse_assembly('''
+    LOAD 0
+    LOAD 1
+    ADD
+    STORE 2
+    STOP
+''')
+
+class TestTieredRuntime(unittest.TestCase):
+
+    def test_promotion(self):
+        with TieredRuntime(threshold=3, opt_level=0) as runtime:
+            in_array = [2**255, 2**255 + 5] + [0] * 254
+            for _ in range(3):
+                result, _, out_array = runtime.run(ADD, in_array, [0] * 256)
+                self.assertEqual((result, out_array[2]), (0, 5))
+            runtime.wait()
+            self.assertEqual(runtime.tier(ADD), "native")
+
+            result, _, out_array = runtime.run(ADD, in_array, [0] * 256)
+            self.assertEqual((result, out_array[2]), (0, 5))
+            stats = runtime.stats()
+            self.assertEqual(stats["interpreted_runs"], 3)
+            self.assertEqual(stats["native_runs"], 1)
+            self.assertEqual(stats["promotions"], 1)
+
+    def test_cold_program_stays_interpreted(self):
+        with TieredRuntime(threshold=10, opt_level=0) as runtime:
+            runtime.run(ADD, [1, 2] + [0] * 254, [0] * 256)
+            self.assertEqual(runtime.tier(ADD), "interpreter")
+            self.assertEqual(runtime.engine.stats()["misses"], 0)
+
+    def test_failed_promotion(self):
+        underflow = parse_assembly("ADD\nSTOP")
+        with TieredRuntime(threshold=1, promote_stack=True) as runtime:
+            self.assertEqual(runtime.run(underflow, [0] * 256, [0] * 256)[0], 2)
+            runtime.wait()
+            self.assertEqual(runtime.run(underflow, [0] * 256, [0] * 256)[0], 2)
+            self.assertEqual(runtime.tier(underflow), "interpreter")
+            self.assertEqual(runtime.stats()["failed_promotions"], 1)
+
+    def test_layout(self):
+        # Results do not change when a program with a narrow layout is promoted
+        overflow = parse_assembly("LOAD 0\n" * 5 + "STORE 0\nSTOP")
+        with TieredRuntime(threshold=1, opt_level=0, word_size=64, capacity=4) as runtime:
+            for _ in range(2):
+                self.assertEqual(runtime.run(ADD, [2**64 - 1, 2] + [0] * 254, [0] * 256)[2][2], 1)
+                self.assertEqual(runtime.run(overflow, [0] * 256, [0] * 256)[0], 1)
+                runtime.wait()
+            self.assertEqual(runtime.tier(ADD), "native")